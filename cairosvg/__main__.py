@@ -23,7 +23,12 @@ import argparse
 import os
 import sys
 
-from . import SURFACES, VERSION
+from . import SURFACES, VERSION, css
+
+
+def tolerance(value):
+    """Parse the value of the tolerance option."""
+    return value if value == 'auto' else float(value)
 
 
 def main(argv=None, stdout=None, stdin=None):
@@ -58,6 +63,21 @@ def main(argv=None, stdout=None, stdin=None):
     parser.add_argument(
         '--output-height', default=None, type=float,
         help='desired output height in pixels')
+    parser.add_argument(
+        '--tolerance', default=None, type=tolerance,
+        help='maximum error of curve approximations in device units, '
+             'or "auto" to use a value suited to the output format')
+    parser.add_argument(
+        '--simplify', default=None, type=float, metavar='TOLERANCE',
+        help='simplify lines, keeping them closer than TOLERANCE device '
+             'units to the original ones')
+    parser.add_argument(
+        '--streaming', action='store_true',
+        help='draw elements while the input is parsed, to save memory')
+    parser.add_argument(
+        '--stylesheet', action='append', default=[], metavar='FILENAME',
+        help='stylesheet applied after the stylesheets of the input, '
+             'can be given multiple times')
 
     parser.add_argument('-o', '--output', default='-', help='output filename')
 
@@ -66,7 +86,11 @@ def main(argv=None, stdout=None, stdin=None):
         'parent_width': options.width, 'parent_height': options.height,
         'dpi': options.dpi, 'scale': options.scale, 'unsafe': options.unsafe,
         'output_width': options.output_width,
-        'output_height': options.output_height}
+        'output_height': options.output_height,
+        'tolerance': options.tolerance, 'simplify': options.simplify,
+        'streaming': options.streaming,
+        'stylesheets': [
+            css.Stylesheet(url=filename) for filename in options.stylesheet]}
     stdin = stdin or sys.stdin
     stdout = stdout or sys.stdout
     kwargs['write_to'] = (
@@ -21,15 +21,19 @@ A bounding box is a (minx, miny, width, height) tuple.
 
 """
 
-from math import acos, atan, cos, fmod, isinf, pi, radians, sin, sqrt, tan
+from math import acos, atan, cos, fmod, isinf, pi, sin, sqrt, tan
 
 from .features import match_features
-from .helpers import PATH_LETTERS, normalize, point, size
+from .helpers import PointError, numpy, points, size
 from .parser import Tree
+from .path_data import parse_path
 from .url import parse_url
 
 EMPTY_BOUNDING_BOX = float('inf'), float('inf'), 0, 0
 
+# Tags whose bounding box is the bounding box of their children
+GROUP_TAGS = frozenset(('g', 'marker'))
+
 
 def calculate_bounding_box(surface, node):
     """Calculate ``node``'s bounding box.
@@ -81,151 +85,42 @@ def bounding_box_line(surface, node):
 
 def bounding_box_polyline(surface, node):
     """Get the bounding box of a ``polyline`` or ``polygon`` node."""
-    bounding_box = EMPTY_BOUNDING_BOX
-    points = []
-    normalized_points = normalize(node.get('points', ''))
-    while normalized_points:
-        x, y, normalized_points = point(surface, normalized_points)
-        points.append((x, y))
-    return extend_bounding_box(bounding_box, points)
+    coordinates = points(surface, node.get('points', ''))
+    if len(coordinates) % 2:
+        raise PointError
+    elif not len(coordinates):
+        return EMPTY_BOUNDING_BOX
+    xs, ys = coordinates[0::2], coordinates[1::2]
+    if numpy is None:
+        minx, miny, maxx, maxy = min(xs), min(ys), max(xs), max(ys)
+    else:
+        minx, miny, maxx, maxy = map(
+            float, (xs.min(), ys.min(), xs.max(), ys.max()))
+    return extend_bounding_box(
+        EMPTY_BOUNDING_BOX, ((minx, miny), (maxx, maxy)))
 
 
 def bounding_box_path(surface, node):
     """Get the bounding box of a ``path`` node."""
-    path_data = node.get('d', '')
-
-    # Normalize path data for correct parsing
-    for letter in PATH_LETTERS:
-        path_data = path_data.replace(letter, ' {} '.format(letter))
-    path_data = normalize(path_data)
+    points = []
+    x, y = 0, 0
+    for segment in parse_path(node.get('d', '')).segments:
+        segment_type = segment[0]
+        if segment_type == 'A':
+            # Elliptical arc curve, extend with its own bounding box
+            rx, ry, rotation, large, sweep = segment[1:6]
+            x1, y1, width, height = bounding_box_elliptical_arc(
+                x, y, rx, ry, rotation, large, sweep, *segment[-2:])
+            points.extend(((x1, y1), (x1 + width, y1 + height)))
+        elif segment_type != 'Z':
+            # Extend with all the coordinates, including control points
+            coordinates = segment[1:]
+            points.extend(zip(coordinates[::2], coordinates[1::2]))
+        x, y = segment[-2:]
 
     bounding_box = EMPTY_BOUNDING_BOX
-    previous_x = 0
-    previous_y = 0
-    letter = 'M'    # Move as default
-    while path_data:
-        path_data = path_data.strip()
-        if path_data.split(' ', 1)[0] in PATH_LETTERS:
-            letter, path_data = (path_data + ' ').split(' ', 1)
-
-        if letter in 'aA':
-            # Elliptical arc curve
-            rx, ry, path_data = point(None, path_data)
-            rotation, path_data = path_data.split(' ', 1)
-            rotation = radians(float(rotation))
-
-            # The large and sweep values are not always separated from the
-            # following values, here is the crazy parser
-            large, path_data = path_data[0], path_data[1:].strip()
-            while not large[-1].isdigit():
-                large, path_data = large + path_data[0], path_data[1:].strip()
-            sweep, path_data = path_data[0], path_data[1:].strip()
-            while not sweep[-1].isdigit():
-                sweep, path_data = sweep + path_data[0], path_data[1:].strip()
-
-            large, sweep = bool(int(large)), bool(int(sweep))
-
-            x, y, path_data = point(None, path_data)
-
-            # Relative coordinate, convert to absolute
-            if letter == 'a':
-                x += previous_x
-                y += previous_y
-
-            # Extend bounding box with start and end coordinates
-            arc_bounding_box = bounding_box_elliptical_arc(
-                previous_x, previous_y, rx, ry, rotation, large, sweep, x, y)
-            x1, y1, width, height = arc_bounding_box
-            x2 = x1 + width
-            y2 = y1 + height
-            points = (x1, y1), (x2, y2)
-            bounding_box = extend_bounding_box(bounding_box, points)
-            previous_x = x
-            previous_y = y
-
-        elif letter in 'cC':
-            # Curve
-            x1, y1, path_data = point(None, path_data)
-            x2, y2, path_data = point(None, path_data)
-            x, y, path_data = point(None, path_data)
-
-            # Relative coordinates, convert to absolute
-            if letter == 'c':
-                x1 += previous_x
-                y1 += previous_y
-                x2 += previous_x
-                y2 += previous_y
-                x += previous_x
-                y += previous_y
-
-            # Extend bounding box with all coordinates
-            bounding_box = extend_bounding_box(
-                bounding_box, ((x1, y1), (x2, y2), (x, y)))
-            previous_x = x
-            previous_y = y
-
-        elif letter in 'hH':
-            # Horizontal line
-            x, path_data = (path_data + ' ').split(' ', 1)
-            x = size(surface, x, 'x')
-
-            # Relative coordinate, convert to absolute
-            if letter == 'h':
-                x += previous_x
-
-            # Extend bounding box with coordinate
-            bounding_box = extend_bounding_box(
-                bounding_box, ((x, previous_y),))
-            previous_x = x
-
-        elif letter in 'lLmMtT':
-            # Line/Move/Smooth quadratic curve
-            x, y, path_data = point(None, path_data)
-
-            # Relative coordinate, convert to absolute
-            if letter in 'lmt':
-                x += previous_x
-                y += previous_y
-
-            # Extend bounding box with coordinate
-            bounding_box = extend_bounding_box(bounding_box, ((x, y),))
-            previous_x = x
-            previous_y = y
-
-        elif letter in 'qQsS':
-            # Quadratic curve/Smooth curve
-            x1, y1, path_data = point(None, path_data)
-            x, y, path_data = point(None, path_data)
-
-            # Relative coordinates, convert to absolute
-            if letter in 'qs':
-                x1 += previous_x
-                y1 += previous_y
-                x += previous_x
-                y += previous_y
-
-            # Extend bounding box with coordinates
-            bounding_box = extend_bounding_box(
-                bounding_box, ((x1, y1), (x, y)))
-            previous_x = x
-            previous_y = y
-
-        elif letter in 'vV':
-            # Vertical line
-            y, path_data = (path_data + ' ').split(' ', 1)
-            y = size(surface, y, 'y')
-
-            # Relative coordinate, convert to absolute
-            if letter == 'v':
-                y += previous_y
-
-            # Extend bounding box with coordinate
-            bounding_box = extend_bounding_box(
-                bounding_box, ((previous_x, y),))
-            previous_y = y
-
-        path_data = path_data.strip()
-
+    if points:
+        bounding_box = extend_bounding_box(bounding_box, points)
     return bounding_box
 
 
@@ -347,12 +242,31 @@ def bounding_box_elliptical_arc(x1, y1, rx, ry, phi, large, sweep, x, y):
 
 
 def bounding_box_group(surface, node):
-    """Get the bounding box of a ``g`` node."""
-    bounding_box = EMPTY_BOUNDING_BOX
-    for child in node.children:
-        bounding_box = combine_bounding_box(
-            bounding_box, calculate_bounding_box(surface, child))
-    return bounding_box
+    """Get the bounding box of a ``g`` node.
+
+    Nested groups are handled with an explicit stack instead of recursion, so
+    that deeply nested documents can be handled.
+
+    """
+    # Stack of [group, children iterator, bounding box of visited children]
+    stack = [[node, iter(node.children), EMPTY_BOUNDING_BOX]]
+    while True:
+        group, children, bounding_box = item = stack[-1]
+        for child in children:
+            if child.tag in GROUP_TAGS and 'bounding_box' not in child:
+                item[2] = bounding_box
+                stack.append([child, iter(child.children), EMPTY_BOUNDING_BOX])
+                break
+            bounding_box = combine_bounding_box(
+                bounding_box, calculate_bounding_box(surface, child))
+        else:
+            stack.pop()
+            if not stack:
+                return bounding_box
+            if is_non_empty_bounding_box(bounding_box):
+                group['bounding_box'] = bounding_box
+            stack[-1][2] = combine_bounding_box(
+                stack[-1][2], group.get('bounding_box'))
 
 
 def bounding_box_use(surface, node):
@@ -20,6 +20,7 @@ SVG colors.
 """
 
 import re
+from functools import lru_cache
 
 COLORS = {
     'aliceblue': (240 / 255, 248 / 255, 255 / 255, 1),
@@ -209,6 +210,7 @@ HEX_RRGGBB = re.compile('#[0-9a-f]{6}')
 HEX_RGB = re.compile('#[0-9a-f]{3}')
 
 
+@lru_cache(maxsize=1024)
 def color(string, opacity=1):
     """Replace ``string`` representing a color by a RGBA tuple.
 
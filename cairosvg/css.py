@@ -22,11 +22,187 @@ Handle CSS stylesheets.
 import cssselect2
 import tinycss2
 
-from .url import parse_url
+from .helpers import LRUCache
+from .url import fetch, parse_url, read_url
+
+# Compiled stylesheets, see ``parse_stylesheets``
+STYLESHEET_CACHE = LRUCache(128)
+
+# Parsed style attributes, see ``parse_style``
+STYLE_CACHE = LRUCache(1024)
+
+
+class Matcher(object):
+    """Selectors indexed by the elements they can match.
+
+    Selectors are stored in buckets keyed by the id, a class or the tag of
+    their rightmost compound selector, and in these buckets by the id, a class
+    or the tag required for one of the ancestors of the matched elements.
+    Only the selectors of the buckets matching an element and its ancestors
+    are tested.
+
+    ``match`` gives the same results as :class:`cssselect2.Matcher`.
+
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.ancestor_keys = set()
+        self.order = 0
+
+    def add_selector(self, selector, compiled_selector, payload):
+        """Add a parsed ``selector`` and its ``payload``."""
+        self.order += 1
+        subject_key, ancestor_key = selector_keys(selector.parsed_tree)
+        if ancestor_key is not None:
+            self.ancestor_keys.add(ancestor_key)
+        self.buckets.setdefault(subject_key, {}).setdefault(
+            ancestor_key, []).append((
+                compiled_selector.test, compiled_selector.specificity,
+                self.order, compiled_selector.pseudo_element, payload))
+
+    def match(self, element):
+        """Get the selectors matching ``element``.
+
+        Return the list of the ``(specificity, order, pseudo_element,
+        payload)`` tuples of the selectors, by specificity and order.
+
+        """
+        relevant_selectors = []
+        if not self.buckets:
+            return relevant_selectors
+
+        keys = ['.' + class_name for class_name in element.classes]
+        keys.append(element.local_name)
+        keys.append(None)
+        if element.id is not None:
+            keys.append('#' + element.id)
+
+        ancestor_keys = None
+        for key in keys:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                continue
+            entries = [bucket.get(None, ())]
+            if len(bucket) > (None in bucket):
+                if ancestor_keys is None:
+                    ancestor_keys = self.element_ancestor_keys(element)
+                if len(bucket) < len(ancestor_keys):
+                    entries.extend(
+                        selectors for ancestor_key, selectors in bucket.items()
+                        if ancestor_key in ancestor_keys)
+                else:
+                    entries.extend(
+                        bucket[ancestor_key] for ancestor_key in ancestor_keys
+                        if ancestor_key in bucket)
+            for selectors in entries:
+                for test, specificity, order, pseudo, payload in selectors:
+                    if test(element):
+                        relevant_selectors.append(
+                            (specificity, order, pseudo, payload))
+
+        relevant_selectors.sort()
+        return relevant_selectors
+
+    def element_ancestor_keys(self, element):
+        """Get the keys of the ancestors of ``element`` used by selectors.
+
+        The wrapper of each ancestor caches the keys of the ancestor and of its
+        own ancestors, built from the keys cached by its parent: the keys of
+        the elements of a document are found in linear time. Only the keys
+        included in ``ancestor_keys`` are kept, nested elements adding no
+        such key share the set of their parent.
+
+        """
+        keys = frozenset()
+        ancestors = []
+        ancestor = element.parent
+        while ancestor is not None:
+            cache = vars(ancestor).get('_ancestor_keys')
+            if cache is not None and self in cache:
+                keys = cache[self]
+                break
+            ancestors.append(ancestor)
+            ancestor = ancestor.parent
+        for ancestor in reversed(ancestors):
+            ancestor_keys = self.ancestor_keys.intersection(
+                element_keys(ancestor))
+            if not ancestor_keys <= keys:
+                keys = keys.union(ancestor_keys)
+            vars(ancestor).setdefault('_ancestor_keys', {})[self] = keys
+        return keys
+
+
+def compound_key(compound):
+    """Get the id, class or tag required by ``compound``, or ``None``."""
+    keys = {}
+    for simple_selector in compound.simple_selectors:
+        if isinstance(simple_selector, cssselect2.parser.IDSelector):
+            keys['#'] = '#' + simple_selector.ident
+        elif isinstance(simple_selector, cssselect2.parser.ClassSelector):
+            keys['.'] = '.' + simple_selector.class_name
+        elif isinstance(simple_selector, cssselect2.parser.LocalNameSelector):
+            keys[''] = simple_selector.local_name
+    return keys.get('#') or keys.get('.') or keys.get('')
+
+
+def selector_keys(parsed_tree):
+    """Get the keys of the subject and of an ancestor of a selector.
+
+    Compound selectors on the left of descendant and child combinators match
+    ancestors of the subject, the nearest one requiring a key is used.
+
+    """
+    node = parsed_tree
+    if isinstance(node, cssselect2.parser.CombinedSelector):
+        subject_key = compound_key(node.right)
+    else:
+        subject_key = compound_key(node)
+    ancestor_key = None
+    while (ancestor_key is None and
+           isinstance(node, cssselect2.parser.CombinedSelector)):
+        left = node.left
+        if node.combinator in (' ', '>'):
+            ancestor_key = compound_key(
+                left.right
+                if isinstance(left, cssselect2.parser.CombinedSelector)
+                else left)
+        node = left
+    return subject_key, ancestor_key
+
+
+def element_keys(element):
+    """Get the id, the classes and the tag of ``element``."""
+    keys = {element.local_name}
+    if element.id is not None:
+        keys.add('#' + element.id)
+    keys.update('.' + class_name for class_name in element.classes)
+    return keys
+
+
+class Stylesheet(object):
+    """Stylesheet applied to converted documents.
+
+    The stylesheet is read from ``string``, or from ``url`` with
+    ``url_fetcher``, and compiled once. It can then be given to the
+    ``stylesheets`` option of conversions, see ``parse_stylesheets``.
+
+    """
+    def __init__(self, string=None, url=None, url_fetcher=fetch):
+        self.url = url
+        self.url_fetcher = url_fetcher
+        if string is None:
+            if url is None:
+                raise TypeError('No input. Use one of string or url.')
+            string = self.fetch_url(parse_url(url), 'text/css').decode('utf-8')
+        self.text = string
+        self.rules = tuple(compile_rules(self, string, url))
+
+    def fetch_url(self, url, resource_type):
+        return read_url(url, self.url_fetcher, resource_type)
 
 
 def find_stylesheets(tree):
-    """Find the stylesheets included in ``tree``."""
+    """Find the text of the stylesheets included in ``tree``."""
     # TODO: support contentStyleType on <svg>
     default_type = 'text/css'
     for element in tree.xml_tree.iter():
@@ -37,8 +213,7 @@ def find_stylesheets(tree):
             # TODO: pass href for relative URLs
             # TODO: support media types
             # TODO: what if <style> has children elements?
-            yield tinycss2.parse_stylesheet(
-                element.text, skip_comments=True, skip_whitespace=True)
+            yield element.text
 
 
 def find_stylesheets_rules(tree, stylesheet_rules, url):
@@ -65,6 +240,12 @@ def find_stylesheets_rules(tree, stylesheet_rules, url):
 
 
 def parse_declarations(input):
+    """Parse the declarations of a string or a list of tinycss2 tokens.
+
+    Return two tuples of ``(name, value)`` tuples, for normal and !important
+    declarations.
+
+    """
     normal_declarations = []
     important_declarations = []
     for declaration in tinycss2.parse_declaration_list(input):
@@ -78,31 +259,87 @@ def parse_declarations(input):
                 important_declarations if declaration.important
                 else normal_declarations)
             declarations.append((declaration.lower_name, value))
-    return normal_declarations, important_declarations
+    return tuple(normal_declarations), tuple(important_declarations)
 
 
-def parse_stylesheets(tree, url):
+def parse_style(string):
+    """Parse the declarations of a ``style`` attribute.
+
+    The declarations are parsed once for each string and stored in
+    ``STYLE_CACHE``, see ``parse_declarations``.
+
+    """
+    return STYLE_CACHE.get(string, parse_declarations)
+
+
+def parse_stylesheets(tree, url, stylesheets=()):
     """Find and parse the stylesheets in ``tree``.
 
-    Return two :class:`cssselect2.Matcher` objects,
-    for normal and !important declarations.
+    Return two :class:`Matcher` objects,
+    for normal and !important declarations, or ``None`` if the stylesheets
+    include no rule. Elements are then not matched against selectors.
+
+    The rules of the :class:`Stylesheet` objects of ``stylesheets`` are
+    applied after the rules of the document, as if the stylesheets were
+    included at the end of the document.
+
+    The matchers are shared by the documents including the same stylesheets
+    with the same base ``url``, they are stored in ``STYLESHEET_CACHE``.
+
+    """
+    texts = tuple(find_stylesheets(tree))
+    stylesheets = tuple(stylesheets)
+    if not texts and not stylesheets:
+        return None
+    # The base URL and the URL fetcher are only used by document stylesheets
+    key = (texts, url, tree.url_fetcher) if texts else (texts, None, None)
+    return STYLESHEET_CACHE.get(
+        key + (stylesheets,),
+        lambda key: compile_stylesheets(tree, texts, url, stylesheets))
+
+
+def compile_rules(tree, text, url):
+    """Compile the rules of the stylesheet ``text``.
+
+    Yield ``(selector, compiled_selector, normal_declarations,
+    important_declarations)`` tuples, see ``Matcher.add_selector``.
 
     """
-    normal_matcher = cssselect2.Matcher()
-    important_matcher = cssselect2.Matcher()
-    for stylesheet in find_stylesheets(tree):
-        for rule in find_stylesheets_rules(tree, stylesheet, url):
-            normal_declarations, important_declarations = parse_declarations(
-                rule.content)
-            for selector in cssselect2.compile_selector_list(rule.prelude):
-                if (selector.pseudo_element is None and
-                        not selector.never_matches):
-                    if normal_declarations:
-                        normal_matcher.add_selector(
-                            selector, normal_declarations)
-                    if important_declarations:
-                        important_matcher.add_selector(
-                            selector, important_declarations)
+    stylesheet = tinycss2.parse_stylesheet(
+        text, skip_comments=True, skip_whitespace=True)
+    for rule in find_stylesheets_rules(tree, stylesheet, url):
+        normal_declarations, important_declarations = parse_declarations(
+            rule.content)
+        for selector in cssselect2.parser.parse(rule.prelude):
+            compiled_selector = cssselect2.compiler.CompiledSelector(selector)
+            if (selector.pseudo_element is None and
+                    not compiled_selector.never_matches):
+                yield (
+                    selector, compiled_selector, normal_declarations,
+                    important_declarations)
+
+
+def compile_stylesheets(tree, texts, url, stylesheets=()):
+    """Compile the stylesheets of a document, see ``parse_stylesheets``."""
+    rules = [rule for text in texts for rule in compile_rules(tree, text, url)]
+    for stylesheet in stylesheets:
+        rules.extend(stylesheet.rules)
+
+    normal_matcher = Matcher()
+    important_matcher = Matcher()
+    empty = True
+    for (selector, compiled_selector, normal_declarations,
+         important_declarations) in rules:
+        if normal_declarations:
+            normal_matcher.add_selector(
+                selector, compiled_selector, normal_declarations)
+            empty = False
+        if important_declarations:
+            important_matcher.add_selector(
+                selector, compiled_selector, important_declarations)
+            empty = False
+    if empty:
+        return None
     return normal_matcher, important_matcher
 
 
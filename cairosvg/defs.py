@@ -22,10 +22,9 @@ This module handles clips, gradients, masks, patterns and external nodes.
 """
 
 from .bounding_box import calculate_bounding_box, is_non_empty_bounding_box
-from .colors import color
 from .features import match_features
-from .helpers import paint, size, transform
-from .parser import Tree
+from .helpers import size, transform
+from .parser import Tree, definition_elements, definition_types
 from .shapes import rect
 from .surface import cairo
 from .url import parse_url
@@ -47,8 +46,16 @@ EXTEND_OPERATORS = {
 
 
 def update_def_href(surface, def_name, def_dict):
-    """Update the attributes of the def according to its href attribute."""
+    """Update the attributes of the def according to its href attribute.
+
+    Href chains are resolved once per surface, the resolved defs are kept in
+    ``surface.resolved_defs`` until a definition is parsed again.
+
+    """
     def_node = def_dict[def_name]
+    resolved_key = (id(def_dict), def_name)
+    if surface.resolved_defs.get(resolved_key) is def_node:
+        return
     href = parse_url(
         def_node.get('{http://www.w3.org/1999/xlink}href')).fragment
     if href in def_dict:
@@ -62,25 +69,41 @@ def update_def_href(surface, def_name, def_dict):
         for key, value in href_node.items():
             if key not in def_dict[def_name]:
                 def_dict[def_name][key] = value
+    surface.resolved_defs[resolved_key] = def_dict[def_name]
 
 
-def parse_all_defs(surface, node):
-    """Recursively visit all child nodes and process definition elements."""
+def parse_all_defs(surface, node, elements=None):
+    """Visit child nodes and process definition elements.
 
-    # Handle node
-    parse_def(surface, node)
+    Only the nodes including definitions are visited, the children of other
+    nodes are not created. These nodes are found when documents are parsed,
+    see ``parser.Document``. Nodes are visited in document order with an
+    explicit stack, so that deeply nested documents can be parsed.
+
+    """
+    if elements is None:
+        elements = node.document.definitions
+    if elements is None:
+        elements = definition_elements(node.xml_tree)
+
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+
+        # Handle node
+        parse_def(surface, node)
 
-    # Visit all children recursively
-    if node.children:
-        for child in node.children:
-            parse_all_defs(surface, child)
+        # Visit children including definitions
+        nodes.extend(reversed([
+            child for child in node.children if child.xml_tree in elements]))
 
 
 def parse_def(surface, node):
     """Parse the SVG definitions."""
-    for def_type in (
-            'marker', 'gradient', 'pattern', 'path', 'mask', 'filter'):
-        if def_type in node.tag.lower() and 'id' in node:
+    def_types = definition_types(node.tag)
+    if def_types and 'id' in node:
+        surface.resolved_defs.clear()
+        for def_type in def_types:
             getattr(surface, '{}s'.format(def_type))[node['id']] = node
 
 
@@ -216,10 +239,8 @@ def draw_gradient(surface, node, name):
     offset = 0
     for child in gradient_node.children:
         offset = max(offset, size(surface, child.get('offset'), 1))
-        stop_color = color(
-            child.get('stop-color', 'black'),
-            float(child.get('stop-opacity', 1)))
-        gradient_pattern.add_color_stop_rgba(offset, *stop_color)
+        gradient_pattern.add_color_stop_rgba(
+            offset, *child.value('stop-color'))
 
     # Set spread method for gradient outside target bounds
     gradient_pattern.set_extend(EXTEND_OPERATORS.get(
@@ -231,7 +252,8 @@ def draw_gradient(surface, node, name):
 
 def draw_pattern(surface, node, name):
     """Draw a pattern image."""
-    pattern_node = surface.patterns[name]
+    # Draw a copy, the resolved pattern is shared by the painted nodes
+    pattern_node = surface.patterns[name].copy()
     pattern_node.tag = 'g'
     transform(surface, pattern_node.get('patternTransform'))
 
@@ -339,9 +361,7 @@ def apply_filter_after_painting(surface, node, name):
                 width *= size(surface, child.get('width', 0), 1)
                 height *= size(surface, child.get('height', 0), 1)
                 rect(surface, dict(x=x, y=y, width=width, height=height))
-                surface.context.set_source_rgba(*color(
-                    paint(child.get('flood-color'))[1],
-                    float(child.get('flood-opacity', 1))))
+                surface.context.set_source_rgba(*child.value('flood-color'))
                 surface.context.fill()
                 surface.context.restore()
 
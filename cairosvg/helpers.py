@@ -20,11 +20,20 @@ Surface helpers.
 """
 
 import re
+import struct
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
 from math import atan2, cos, radians, sin, tan
+from threading import Lock
 
 from .surface import cairo
 from .url import parse_url
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 UNITS = {
     'mm': 1 / 25.4,
     'cm': 1 / 2.54,
@@ -34,20 +43,159 @@ UNITS = {
     'px': None,
 }
 
+NUMBER = re.compile(
+    r'([+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)(%|[a-zA-Z]*)')
 PAINT_URL = re.compile(r'(url\(.+\)) *(.*)')
 PATH_LETTERS = 'achlmqstvzACHLMQSTVZ'
-RECT = re.compile(r'rect\( ?(.+?) ?\)')
+PATH_ARGUMENTS = {
+    'a': 7, 'c': 6, 'h': 1, 'l': 2, 'm': 2, 'q': 4, 's': 4, 't': 2, 'v': 1,
+    'z': 0}
+PATH_LETTER = re.compile(r'[ \n\r\t,]*([a-zA-Z])')
+PATH_NUMBER = re.compile(
+    r'[ \n\r\t,]*([+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)')
+PATH_FLAG = re.compile(r'[ \n\r\t,]*([0-9])')
+RECT = re.compile(r'rect\((.+?)\)')
+TRANSFORM = re.compile(r'(\w+)[ \n\r\t]*\(([^)]*)\)')
+
+# Headers of Cairo path data items stored as doubles, see ``append_path``
+MOVE_TO, LINE_TO, CURVE_TO, CLOSE_PATH = (
+    struct.unpack('d', struct.pack('ii', path_type, length))[0]
+    for path_type, length in (
+        (cairo.PATH_MOVE_TO, 2), (cairo.PATH_LINE_TO, 2),
+        (cairo.PATH_CURVE_TO, 4), (cairo.PATH_CLOSE_PATH, 1)))
+
+CacheInfo = namedtuple('CacheInfo', ('hits', 'misses', 'maxsize', 'currsize'))
 
 
 class PointError(Exception):
     """Exception raised when parsing a point fails."""
 
 
+class LRUCache(object):
+    """Bounded cache keeping the most recently used values.
+
+    The cache is shared by all the documents rendered by the process, its
+    size can be changed with ``resize`` and its statistics are given by
+    ``info``.
+
+    If ``weight`` is given, ``weight(value)`` is the cost of keeping ``value``
+    and the total weight of the cached values is limited to ``maxweight``.
+
+    """
+    def __init__(self, maxsize=128, weight=None, maxweight=None):
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self.hits = self.misses = 0
+        self._weight = weight
+        self._weights = {}
+        self._total_weight = 0
+        self._values = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, function):
+        """Get the value for ``key``, call ``function(key)`` if missing."""
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                self._values.move_to_end(key)
+                return self._values[key]
+        value = function(key)
+        with self._lock:
+            self.misses += 1
+            weight = 0 if self._weight is None else self._weight(value)
+            if self.maxsize > 0 and key not in self._values and (
+                    self._weight is None or weight <= self.maxweight):
+                # Values heavier than the whole cache are not stored
+                self._values[key] = value
+                self._weights[key] = weight
+                self._total_weight += weight
+                self._evict(self.maxsize)
+        return value
+
+    def _evict(self, maxsize):
+        """Remove the oldest values until the limits are respected."""
+        while self._values and (
+                len(self._values) > max(maxsize, 0) or (
+                    self._weight is not None and
+                    self._total_weight > self.maxweight)):
+            key, _ = self._values.popitem(last=False)
+            self._total_weight -= self._weights.pop(key, 0)
+
+    def resize(self, maxsize):
+        """Set the maximum number of cached values."""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict(maxsize)
+
+    def clear(self):
+        """Remove the cached values and reset the statistics."""
+        with self._lock:
+            self._values.clear()
+            self._weights.clear()
+            self._total_weight = 0
+            self.hits = self.misses = 0
+
+    def info(self):
+        """Return the cache statistics."""
+        return CacheInfo(
+            self.hits, self.misses, self.maxsize, len(self._values))
+
+
+def append_path(surface, data):
+    """Append the ``data`` array of path data to the path of ``surface``.
+
+    ``data`` is an array of doubles laid out as Cairo path data items: a header
+    (``MOVE_TO``, ``LINE_TO``, ``CURVE_TO`` or ``CLOSE_PATH``) and a padding
+    value, followed by the coordinates of the points. The whole path is given
+    to Cairo in one call instead of one call per segment.
+
+    """
+    if len(data):
+        append_raw_path(surface.context, data)
+
+
+def append_raw_path(context, data):
+    """Append the ``data`` array of Cairo path data items to ``context``.
+
+    cairocffi has no public function appending raw path data. The private
+    ``Context._pointer`` and ``Context._check_status`` attributes, found in
+    cairocffi 1.0 to 1.7, are only used here to give ``data`` to Cairo without
+    copying it. When they are missing, the items are decoded and given to the
+    public ``Context.append_path`` method.
+
+    """
+    pointer = getattr(context, '_pointer', None)
+    check_status = getattr(context, '_check_status', None)
+    if pointer is not None and check_status is not None:
+        try:
+            # Keep a reference to the buffer while Cairo reads it
+            buffer = cairo.ffi.from_buffer('cairo_path_data_t[]', data)
+        except TypeError:
+            # Typed buffers need cffi 1.12
+            pass
+        else:
+            path = cairo.ffi.new('cairo_path_t *', {
+                'status': cairo.STATUS_SUCCESS, 'data': buffer,
+                'num_data': len(data) // 2})
+            cairo.cairo.cairo_append_path(pointer, path)
+            check_status()
+            return
+
+    items = []
+    index = 0
+    while index < len(data):
+        path_type, length = struct.unpack('ii', struct.pack('d', data[index]))
+        items.append((path_type, tuple(data[index + 2:index + 2 * length])))
+        index += 2 * length
+    context.append_path(items)
+
+
 def distance(x1, y1, x2, y2):
     """Get the distance between two points."""
     return ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
 
 
+@lru_cache(maxsize=1024)
 def paint(value):
     """Extract from value an uri and a color.
 
@@ -81,8 +229,7 @@ def node_format(surface, node, reference=True):
     height = size(surface, node.get('height', '100%'), reference_size[1])
     viewbox = node.get('viewBox')
     if viewbox:
-        viewbox = re.sub('[ \n\r\t,]+', ' ', viewbox)
-        viewbox = tuple(float(position) for position in viewbox.split())
+        viewbox = tuple(number for number, unit in numbers(viewbox))
         width = width or viewbox[2]
         height = height or viewbox[3]
     return width, height, viewbox
@@ -97,6 +244,54 @@ def normalize(string):
     return string.strip()
 
 
+def numbers(string):
+    """Return the list of ``(number, unit)`` tokens of the ``string`` list.
+
+    Numbers are floats, units are strings, empty for unitless numbers.
+
+    """
+    return [(float(number), unit) for number, unit in NUMBER.findall(string)]
+
+
+def path_commands(string):
+    """Yield ``(letter, arguments)`` tuples from the ``string`` path data.
+
+    Arguments are grouped by command, implicit commands are repeated (``M`` and
+    ``m`` being followed by ``L`` and ``l``) and the arc flags are read as
+    single digits. Parsing stops at the first error.
+
+    See http://www.w3.org/TR/SVG/paths.html#PathDataBNF
+
+    """
+    position = 0
+    letter = None
+    while True:
+        match = PATH_LETTER.match(string, position)
+        if match:
+            letter = match.group(1)
+            if letter not in PATH_LETTERS:
+                return
+            position = match.end()
+        elif letter is None or letter in 'zZ':
+            return
+
+        arguments = []
+        for i in range(PATH_ARGUMENTS[letter.lower()]):
+            is_flag = letter in 'aA' and i in (3, 4)
+            match = (PATH_FLAG if is_flag else PATH_NUMBER).match(
+                string, position)
+            if not match:
+                return
+            arguments.append(float(match.group(1)))
+            position = match.end()
+        yield letter, tuple(arguments)
+
+        if letter == 'M':
+            letter = 'L'
+        elif letter == 'm':
+            letter = 'l'
+
+
 def point(surface, string):
     """Return ``(x, y, trailing_text)`` from ``string``."""
     match = re.match('(.*?) (.*?)(?: |$)', string)
@@ -108,6 +303,23 @@ def point(surface, string):
         raise PointError
 
 
+def points(surface, string):
+    """Return the flat list of coordinates of the ``string`` list of points.
+
+    Coordinates are given in a NumPy array when NumPy is installed.
+
+    """
+    tokens = NUMBER.findall(string)
+    values, units = zip(*tokens) if tokens else ((), ())
+    if any(units):
+        coordinates = [
+            number_size(surface, float(value), unit, 'xy'[i % 2])
+            for i, (value, unit) in enumerate(tokens)]
+    else:
+        coordinates = list(map(float, values))
+    return numpy.array(coordinates) if numpy else coordinates
+
+
 def point_angle(cx, cy, px, py):
     """Return angle between x axis and point knowing given center."""
     return atan2(py - cy, px - cx)
@@ -220,10 +432,11 @@ def transform(surface, string, gradient=None):
     if not string:
         return
 
-    transformations = re.findall(r'(\w+) ?\( ?(.*?) ?\)', normalize(string))
     matrix = cairo.Matrix()
-    for transformation_type, transformation in transformations:
-        values = [size(surface, value) for value in transformation.split(' ')]
+    for transformation_type, transformation in TRANSFORM.findall(string):
+        values = [
+            number_size(surface, number, unit)
+            for number, unit in numbers(transformation)]
         if transformation_type == 'matrix':
             matrix = cairo.Matrix(*values).multiply(matrix)
         elif transformation_type == 'rotate':
@@ -276,17 +489,16 @@ def apply_matrix_transform(surface, matrix, gradient=None):
 
 
 def clip_rect(string):
-    """Parse the rect value of a clip."""
-    match = RECT.search(normalize(string or ''))
-    return match.group(1).split(' ') if match else []
+    """Parse the rect value of a clip into ``(number, unit)`` tokens."""
+    match = RECT.search(string or '')
+    # "auto" values give a null offset
+    return numbers(match.group(1).replace('auto', '0')) if match else []
 
 
 def rotations(node):
     """Retrieves the original rotations of a `text` or `tspan` node."""
     if 'rotate' in node:
-        original_rotate = [
-            float(i) for i in normalize(node['rotate']).strip().split(' ')]
-        return original_rotate
+        return [number for number, unit in numbers(node['rotate'])]
     return []
 
 
@@ -322,6 +534,55 @@ def flatten(node):
     return ''.join(flattened_text)
 
 
+def simplify(surface, xs, ys):
+    """Return the coordinates of the simplified polyline going through points.
+
+    The device space is cut in columns of ``surface.simplify`` device units.
+    In each run of consecutive points in the same column, only the first, the
+    last, the lowest and the highest points are kept: the simplified polyline
+    is then less than a column width away from the original one.
+
+    """
+    if len(xs) <= 4:
+        return xs, ys
+
+    xx, yx, xy, yy, x0, y0 = surface.context.get_matrix().as_tuple()
+    width = surface.simplify
+    if numpy is None:
+        kept = []
+        first = lowest = highest = 0
+        column = (xx * xs[0] + xy * ys[0] + x0) // width
+        low = high = yx * xs[0] + yy * ys[0] + y0
+        for index in range(1, len(xs)):
+            x, y = xs[index], ys[index]
+            point_column = (xx * x + xy * y + x0) // width
+            device_y = yx * x + yy * y + y0
+            if point_column != column:
+                kept.extend(sorted({first, lowest, highest, index - 1}))
+                column = point_column
+                first = lowest = highest = index
+                low = high = device_y
+            elif device_y < low:
+                lowest, low = index, device_y
+            elif device_y >= high:
+                highest, high = index, device_y
+        kept.extend(sorted({first, lowest, highest, len(xs) - 1}))
+        return [xs[index] for index in kept], [ys[index] for index in kept]
+
+    xs, ys = numpy.asarray(xs), numpy.asarray(ys)
+    columns = (xx * xs + xy * ys + x0) // width
+    device_ys = yx * xs + yy * ys + y0
+    starts = numpy.concatenate(
+        ([0], numpy.flatnonzero(numpy.diff(columns)) + 1))
+    ends = numpy.concatenate((starts[1:], [len(xs)])) - 1
+    # Sort the points by run, then by device y
+    runs = numpy.repeat(numpy.arange(len(starts)), ends - starts + 1)
+    order = numpy.lexsort((device_ys, runs))
+    kept = numpy.unique(numpy.concatenate(
+        (starts, ends, order[starts], order[ends])))
+    return xs[kept], ys[kept]
+
+
 def size(surface, string, reference='xy'):
     """Replace a ``string`` with units by a float value.
 
@@ -345,8 +606,26 @@ def size(surface, string, reference='xy'):
     if surface is None:
         return 0
 
-    string = normalize(string).split(' ', 1)[0]
-    if string.endswith('%'):
+    # Only keep the first value, unitless numbers are not valid here as the
+    # string is not a float
+    tokens = numbers(string)
+    if tokens and tokens[0][1]:
+        number, unit = tokens[0]
+        return number_size(surface, number, unit, reference)
+
+    # Unknown size
+    return 0
+
+
+def number_size(surface, number, unit, reference='xy'):
+    """Return the float value of a ``(number, unit)`` token.
+
+    ``reference`` is used for percentages, see ``size``.
+
+    """
+    if not unit:
+        return number
+    elif unit == '%':
         if reference == 'x':
             reference = surface.context_width or 0
         elif reference == 'y':
@@ -356,17 +635,15 @@ def size(surface, string, reference='xy'):
                 (surface.context_width ** 2 +
                  surface.context_height ** 2) ** .5 /
                 2 ** .5)
-        return float(string[:-1]) * reference / 100
-    elif string.endswith('em'):
-        return surface.font_size * float(string[:-2])
-    elif string.endswith('ex'):
+        return number * reference / 100
+    elif unit == 'em':
+        return surface.font_size * number
+    elif unit == 'ex':
         # Assume that 1em == 2ex
-        return surface.font_size * float(string[:-2]) / 2
-
-    for unit, coefficient in UNITS.items():
-        if string.endswith(unit):
-            number = float(string[:-len(unit)])
-            return number * (surface.dpi * coefficient if coefficient else 1)
+        return surface.font_size * number / 2
+    elif unit in UNITS:
+        coefficient = UNITS[unit]
+        return number * (surface.dpi * coefficient if coefficient else 1)
 
     # Unknown size
     return 0
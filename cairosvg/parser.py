@@ -20,21 +20,31 @@ SVG Parser.
 """
 
 import gzip
+import io
 import re
+from functools import lru_cache
+from sys import intern
 from urllib.parse import urlunparse
 from xml.etree.ElementTree import Element
 
 import cssselect2
-from defusedxml import ElementTree
+from defusedxml import ElementTree, EntitiesForbidden
 
 from . import css
 from .features import match_features
 from .helpers import flatten, pop_rotation, rotations
-from .url import fetch, parse_url, read_url
+from .properties import PROPERTIES
+from .url import fetch, open_url, parse_url, read_url
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
 
 # 'display' is actually inherited but handled differently because some markers
 # are part of a none-displaying group (see test painting-marker-07-f.svg)
 NOT_INHERITED_ATTRIBUTES = frozenset((
+    'bounding_box',
     'clip',
     'clip-path',
     'display',
@@ -48,6 +58,7 @@ NOT_INHERITED_ATTRIBUTES = frozenset((
     'stop-color',
     'stop-opacity',
     'style',
+    'text_bounding_box',
     'transform',
     'viewBox',
     'width',
@@ -66,6 +77,12 @@ COLOR_ATTRIBUTES = frozenset((
     'stroke',
 ))
 
+# Definitions, whose types are found in the tags of the definition elements
+DEF_TYPES = ('marker', 'gradient', 'pattern', 'path', 'mask', 'filter')
+
+# Sentinel for missing values, as ``None`` may be a real value
+MISSING = object()
+
 
 def handle_white_spaces(string, preserve):
     """Handle white spaces in text nodes.
@@ -165,99 +182,565 @@ def normalize_font_style_declaration(value):
     """, lambda match: match.group().lower(), value, 0, re.VERBOSE)
 
 
+@lru_cache(maxsize=None)
+def definition_types(tag):
+    """Get the types of the definitions with this ``tag``."""
+    if tag.startswith('{http://www.w3.org/2000/svg}'):
+        tag = tag[len('{http://www.w3.org/2000/svg}'):]
+    return tuple(
+        def_type for def_type in DEF_TYPES if def_type in tag.lower())
+
+
+def definition_elements(element):
+    """Get the XML elements of ``element``'s subtree including definitions."""
+    parents = {child: parent for parent in element.iter() for child in parent}
+    elements = set()
+    for child in element.iter():
+        tag = child.tag
+        if not isinstance(tag, str) or 'id' not in child.attrib:
+            continue
+        if definition_types(tag):
+            while child is not None and child not in elements:
+                elements.add(child)
+                child = parents.get(child)
+    return elements
+
+
+class RawReader(io.RawIOBase):
+    """Raw stream reading the file-like ``source``, only needing ``read``."""
+
+    def __init__(self, source):
+        self.source = source
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.source.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def seekable(source):
+    """Tell whether the file-like ``source`` can be read again."""
+    if hasattr(source, 'seekable'):
+        return source.seekable()
+    return hasattr(source, 'seek') and hasattr(source, 'tell')
+
+
+def decompress(source):
+    """Get a file-like object reading ``source``, decompressed if gzipped.
+
+    Gzipped sources are decompressed while they are read. Sources that can't
+    peek nor seek, such as pipes, are buffered to find their magic number.
+
+    """
+    if hasattr(source, 'peek'):
+        magic_number = source.peek(2)[:2]
+    elif seekable(source):
+        position = source.tell()
+        magic_number = source.read(2)
+        source.seek(position)
+    else:
+        source = io.BufferedReader(RawReader(source))
+        magic_number = source.peek(2)[:2]
+    if magic_number == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=source)
+    return source
+
+
+def parse_defusedxml(source, unsafe):
+    """Parse the file-like ``source`` with defusedxml, return the root."""
+    return ElementTree.parse(
+        source, forbid_entities=not unsafe,
+        forbid_external=not unsafe).getroot()
+
+
+def parse_lxml(source, unsafe):
+    """Parse the file-like ``source`` with lxml, return the root.
+
+    Entities and network access are forbidden and the size of the document is
+    limited, unless ``unsafe`` is ``True``. Documents reaching these limits,
+    too deep or with huge nodes, are parsed again by defusedxml, that has no
+    such limits. Comments and processing instructions are removed, as
+    ElementTree does.
+
+    """
+    if not unsafe:
+        if not seekable(source):
+            # Keep the source to parse it again if limits are reached
+            source = io.BytesIO(source.read())
+        position = source.tell()
+    parser = lxml_etree.XMLParser(
+        resolve_entities=unsafe, no_network=not unsafe, huge_tree=unsafe,
+        remove_comments=True, remove_pis=True)
+    try:
+        tree = lxml_etree.parse(source, parser)
+    except lxml_etree.XMLSyntaxError as exception:
+        if unsafe or not lxml_limit_reached(exception):
+            raise
+        source.seek(position)
+        return parse_defusedxml(source, unsafe)
+    dtd = tree.docinfo.internalDTD
+    if not unsafe and dtd is not None:
+        for entity in dtd.iterentities():
+            raise EntitiesForbidden(
+                entity.name, entity.content, None, entity.system_url, None,
+                None)
+    return tree.getroot()
+
+
+def lxml_limit_reached(exception):
+    """Tell whether the lxml ``exception`` is raised by a libxml2 limit.
+
+    Old versions of libxml2 have no specific error code for these limits,
+    their messages talk about huge documents.
+
+    """
+    limit_code = getattr(lxml_etree.ErrorTypes, 'ERR_RESOURCE_LIMIT', None)
+    return exception.code == limit_code or 'huge' in str(exception).lower()
+
+
+# XML parsers, taking a file-like object and the unsafe flag
+XML_PARSERS = {'defusedxml': parse_defusedxml}
+if lxml_etree is not None:
+    XML_PARSERS['lxml'] = parse_lxml
+DEFAULT_XML_PARSER = 'lxml' if lxml_etree is not None else 'defusedxml'
+
+
+@lru_cache(maxsize=None)
+def split_tag(tag):
+    """Split an ElementTree ``tag`` into its namespace URL and local name."""
+    if tag.startswith('{') and '}' in tag:
+        namespace_url, local_name = tag[1:].rsplit('}', 1)
+        return namespace_url, local_name
+    return '', tag
+
+
+class PlainElement(object):
+    """XML element of a document without stylesheets.
+
+    Nodes of documents whose stylesheets include no rule are built from these
+    elements instead of :class:`cssselect2.ElementWrapper` objects, as no
+    selector has to be matched. Only the attributes used by nodes are given.
+
+    """
+    __slots__ = ('etree_element', 'namespace_url', 'local_name')
+
+    def __init__(self, etree_element):
+        self.etree_element = etree_element
+        self.namespace_url, self.local_name = split_tag(etree_element.tag)
+
+    @classmethod
+    def from_xml_root(cls, root):
+        return cls(root)
+
+    @property
+    def id(self):
+        return self.etree_element.get('id')
+
+    def iter_children(self):
+        for child in self.etree_element:
+            if isinstance(child.tag, str):
+                yield PlainElement(child)
+
+    def iter_subtree(self):
+        for element in self.etree_element.iter():
+            if isinstance(element.tag, str):
+                yield PlainElement(element)
+
+
+class Declarations(dict):
+    """Inherited declarations of a node, shared by nodes with equal values.
+
+    Shared declarations must not be modified.
+
+    """
+    __slots__ = ('_hash',)
+
+    def __hash__(self):
+        if not hasattr(self, '_hash'):
+            self._hash = hash(frozenset(self.items()))
+        return self._hash
+
+
+class Document(object):
+    """Context shared by the nodes of a document.
+
+    ``definitions`` is the set of the XML elements whose subtree includes
+    definitions, found when the document is parsed, or ``None``.
+
+    ``generation`` is incremented when inherited values may have changed, see
+    ``Node.inherited``. The nodes of a document included by a node of a
+    ``parent`` document, as ``use`` elements do, inherit the values of this
+    node: included documents share the generation of their ``root`` document.
+
+    """
+    __slots__ = (
+        'style', 'url_fetcher', 'unsafe', 'definitions', 'generation', 'root',
+        '_declarations', '_ids')
+
+    def __init__(self, style, url_fetcher, unsafe, parent=None):
+        self.style = style
+        self.url_fetcher = url_fetcher
+        self.unsafe = unsafe
+        self.definitions = None
+        self.generation = 0
+        self.root = self if parent is None else parent.root
+        self._declarations = {}
+        self._ids = None
+
+    def modified(self):
+        """Invalidate the inherited values cached by the nodes."""
+        self.root.generation += 1
+
+    def intern(self, declarations):
+        """Get the shared declarations equal to ``declarations``."""
+        return self._declarations.setdefault(declarations, declarations)
+
+    def find(self, root, element_id):
+        """Get the cssselect2 element with ``element_id`` in ``root``.
+
+        ``root`` is the root element of the document. Its elements are indexed
+        by id on the first call, the following calls reuse this index.
+
+        """
+        if self._ids is None:
+            self._ids = {}
+            for element in root.iter_subtree():
+                if element.id is not None:
+                    self._ids.setdefault(element.id, element)
+        return self._ids.get(element_id)
+
+
 class Node(dict):
     """SVG node with dict-like properties and children."""
+    __slots__ = (
+        '_children', '_inherited', '_parent_children', '_values',
+        'declarations', 'document', 'element', 'image_height', 'image_width',
+        'parent', 'root', 'tag', 'text', 'url', 'vertices', 'xml_tree')
 
     def __init__(self, element, style, url_fetcher, parent=None,
                  parent_children=False, url=None, unsafe=False):
-        """Create the Node from ElementTree ``node``, with ``parent`` Node."""
+        """Create the Node from ElementTree ``node``, with ``parent`` Node.
+
+        Children are created when they are accessed for the first time. The
+        cssselect2 ``element`` is then released, see ``children``.
+
+        """
         super().__init__()
-        self.children = ()
+        self._children = None
+        self._inherited = None
+        self._parent_children = parent_children
+        self._values = None
 
         self.root = False
 
         node = element.etree_element
         self.element = element
-        self.style = style
         self.tag = (
             element.local_name
             if element.namespace_url in ('', 'http://www.w3.org/2000/svg') else
             '{%s}%s' % (element.namespace_url, element.local_name))
         self.text = node.text
-        self.url_fetcher = url_fetcher
-        self.unsafe = unsafe
+
+        # Only set document if it's not been set before (ie. if node is a
+        # tree), share the document of the parent when possible
+        if getattr(self, 'document', None) is None:
+            if (parent is not None and parent.style is style and
+                    parent.url_fetcher is url_fetcher and
+                    parent.unsafe is unsafe):
+                self.document = parent.document
+            else:
+                self.document = Document(
+                    style, url_fetcher, unsafe,
+                    None if parent is None else parent.document)
 
         # Only set xml_tree if it's not been set before (ie. if node is a tree)
         self.xml_tree = getattr(self, 'xml_tree', node)
 
-        # Inherits from parent properties
+        # Inherits from parent properties, see ``get``
         if parent is not None:
-            self.update([
-                (attribute, parent[attribute]) for attribute in parent
-                if attribute not in NOT_INHERITED_ATTRIBUTES])
             self.url = url or parent.url
             self.parent = parent
         else:
             self.url = getattr(self, 'url', None)
             self.parent = getattr(self, 'parent', None)
 
-        self.update(self.xml_tree.attrib)
+        declarations = dict(self.xml_tree.attrib)
 
         # Apply CSS rules
         style_attr = node.get('style')
         if style_attr:
-            normal_attr, important_attr = css.parse_declarations(style_attr)
+            normal_attr, important_attr = css.parse_style(style_attr)
         else:
             normal_attr = []
             important_attr = []
-        normal_matcher, important_matcher = style
-        normal = [rule[-1] for rule in normal_matcher.match(element)]
-        important = [rule[-1] for rule in important_matcher.match(element)]
+        if style is None:
+            normal = important = ()
+        else:
+            normal_matcher, important_matcher = style
+            normal = [rule[-1] for rule in normal_matcher.match(element)]
+            important = [
+                rule[-1] for rule in important_matcher.match(element)]
         for declaration_lists in (
                 normal, [normal_attr], important, [important_attr]):
-            for declarations in declaration_lists:
-                for name, value in declarations:
-                    self[name] = value.strip()
+            for declarations_list in declaration_lists:
+                for name, value in declarations_list:
+                    declarations[intern(name)] = intern(value.strip())
 
-        # Replace currentColor by a real color value
+        # Replace currentColor by a real color value, inherited values are
+        # already replaced
         for attribute in COLOR_ATTRIBUTES:
-            if self.get(attribute) == 'currentColor':
-                self[attribute] = self.get('color', 'black')
+            if declarations.get(attribute) == 'currentColor':
+                declarations[attribute] = declarations.get(
+                    'color', self.inherited('color', 'black'))
 
         # Replace inherit by the parent value
         for attribute in [
-                attribute for attribute in self
-                if self[attribute] == 'inherit']:
+                attribute for attribute, value in declarations.items()
+                if value == 'inherit']:
             if parent is not None and attribute in parent:
-                self[attribute] = parent.get(attribute)
+                declarations[attribute] = parent.get(attribute)
             else:
-                del self[attribute]
+                del declarations[attribute]
+
+        # Keep the attributes that are not inherited in the node, share the
+        # other ones with the nodes declaring the same values
+        for attribute in NOT_INHERITED_ATTRIBUTES.intersection(declarations):
+            self[attribute] = declarations.pop(attribute)
+        self.declarations = self.document.intern(Declarations(declarations))
 
         # Manage text by creating children
         if self.tag in ('text', 'textPath', 'a'):
-            self.children, _ = self.text_children(
+            children, _ = self.text_children(
                 element, trailing_space=True, text_root=True)
-
-        if parent_children:
-            self.children = [
-                Node(child.element, style, self.url_fetcher, parent=self,
+            if children and not parent_children:
+                self._children = children
+
+    def __missing__(self, key):
+        value = self.declarations.get(key, MISSING)
+        if value is MISSING:
+            value = self.inherited(key)
+            if value is MISSING:
+                raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def __iter__(self):
+        return iter(self.computed())
+
+    def __len__(self):
+        return len(self.computed())
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.modified(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.modified(key)
+
+    def clear(self):
+        super().clear()
+        self.declarations = Declarations()
+        self.modified()
+
+    def pop(self, *args):
+        self.modified(args[0])
+        return super().pop(*args)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.modified()
+
+    def modified(self, key=None):
+        """Invalidate the cached values after a modification of ``key``."""
+        self._values = None
+        if key not in NOT_INHERITED_ATTRIBUTES:
+            self.document.modified()
+
+    def get(self, key, default=None):
+        """Get the value of ``key``, inherited from the parents if needed."""
+        value = super().get(key, MISSING)
+        if value is MISSING:
+            value = self.declarations.get(key, MISSING)
+            if value is MISSING:
+                return self.inherited(key, default)
+        return value
+
+    def value(self, name):
+        """Get the typed value of the ``name`` property, see ``properties``.
+
+        Values are cached until the node is modified.
+
+        """
+        if self._values is None:
+            self._values = {}
+        if name not in self._values:
+            self._values[name] = PROPERTIES[name](self)
+        return self._values[name]
+
+    def inherited(self, key, default=MISSING):
+        """Get the value of ``key`` inherited from the closest parent.
+
+        The values found are cached in the parents walked through, until an
+        inherited value of any node of the document is modified, see
+        ``Document``. Looking values up in deeply nested documents is then not
+        quadratic.
+
+        """
+        if key in NOT_INHERITED_ATTRIBUTES:
+            return default
+        generation = self.document.root.generation
+        parents = []
+        value = MISSING
+        parent = self.parent
+        while parent is not None:
+            value = dict.get(parent, key, MISSING)
+            if value is MISSING:
+                value = parent.declarations.get(key, MISSING)
+            if value is not MISSING:
+                break
+            cache = parent._inherited
+            if cache is not None and cache[0] == generation:
+                value = cache[1].get(key, MISSING)
+                if key in cache[1]:
+                    break
+            parents.append(parent)
+            parent = parent.parent
+        for parent in parents:
+            cache = parent._inherited
+            if cache is None or cache[0] != generation:
+                cache = parent._inherited = (generation, {})
+            cache[1][key] = value
+        return default if value is MISSING else value
+
+    def computed(self):
+        """Return a dict of the values declared or inherited by the node."""
+        values = {}
+        parent = self.parent
+        while parent is not None:
+            for items in (dict.items(parent), parent.declarations.items()):
+                for key, value in items:
+                    if (key not in values and
+                            key not in NOT_INHERITED_ATTRIBUTES):
+                        values[key] = value
+            parent = parent.parent
+        values.update(self.declarations)
+        values.update(super().items())
+        return values
+
+    def copy(self):
+        """Return a shallow copy of the node.
+
+        Only the attributes of the node are copied, inherited values are still
+        given by its parents. Cached values are not shared with the copy.
+
+        """
+        node = dict.__new__(type(self))
+        dict.update(node, dict.items(self))
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(self, name):
+                    setattr(node, name, getattr(self, name))
+        node._inherited = node._values = None
+        return node
+
+    def keys(self):
+        return self.computed().keys()
+
+    def items(self):
+        return self.computed().items()
+
+    def values(self):
+        return self.computed().values()
+
+    @property
+    def style(self):
+        return self.document.style
+
+    @property
+    def url_fetcher(self):
+        return self.document.url_fetcher
+
+    @property
+    def unsafe(self):
+        return self.document.unsafe
+
+    @property
+    def children(self):
+        """Children nodes, created on first access.
+
+        The cssselect2 element of the node is only needed to create its
+        children, it is released when they are created. Elements are kept for
+        trees, and for the children of gradients and patterns that are copied
+        by the nodes referencing them (see ``defs.update_def_href``).
+
+        """
+        if self._children is None:
+            self._children = self.create_children()
+        if self.element is not None and not self.root:
+            parent_tag = (
+                self.parent.xml_tree.tag.lower()
+                if self.parent is not None else '')
+            if 'gradient' not in parent_tag and 'pattern' not in parent_tag:
+                self.element = None
+        return self._children
+
+    @children.setter
+    def children(self, children):
+        self._children = children
+
+    def create_children(self):
+        """Create and return the children of the node."""
+        if self._parent_children:
+            return [
+                Node(child.element, self.style, self.url_fetcher, parent=self,
                      unsafe=self.unsafe)
-                for child in parent.children]
-        elif not self.children:
-            self.children = []
-            for child in element.iter_children():
-                if match_features(child.etree_element):
-                    self.children.append(
-                        Node(child, style, self.url_fetcher, parent=self,
-                             unsafe=self.unsafe))
-                    if self.tag == 'switch':
-                        break
+                for child in self.parent.children]
+        children = []
+        for child in self.element.iter_children():
+            if match_features(child.etree_element):
+                children.append(
+                    Node(child, self.style, self.url_fetcher, parent=self,
+                         unsafe=self.unsafe))
+                if self.tag == 'switch':
+                    break
+        return children
 
     def fetch_url(self, url, resource_type):
         return read_url(url, self.url_fetcher, resource_type)
 
     def text_children(self, element, trailing_space, text_root=False):
-        """Create children and return them."""
+        """Create children and return them.
+
+        Nested text children are created with an explicit stack of
+        ``iter_text_children`` generators instead of recursion.
+
+        """
+        stack = [self.iter_text_children(element, trailing_space, text_root)]
+        result = None
+        while stack:
+            try:
+                request = stack[-1].send(result)
+            except StopIteration as exception:
+                stack.pop()
+                result = exception.value
+            else:
+                stack.append(request)
+                result = None
+        return result
+
+    def iter_text_children(self, element, trailing_space, text_root=False):
+        """Create children and return them, see ``text_children``.
+
+        The generators of the children text are yielded, the children and
+        their trailing space are then sent back.
+
+        """
         children = []
         space = '{http://www.w3.org/XML/1998/namespace}space'
         preserve = self.get(space) == 'preserve'
@@ -279,7 +762,7 @@ class Node(dict):
                     url=url, url_fetcher=self.url_fetcher, parent=self,
                     unsafe=self.unsafe)
                 child_tree.clear()
-                child_tree.update(self)
+                child_tree.update(self.items())
                 child_node = Node(
                     child_element, self.style, self.url_fetcher,
                     parent=child_tree, parent_children=True,
@@ -289,15 +772,16 @@ class Node(dict):
                 # and remove the node children.
                 child = child_tree.xml_tree
                 child.text = flatten(child)
-                child_element = cssselect2.ElementWrapper.from_xml_root(child)
+                child_element = type(element).from_xml_root(child)
             else:
                 child_node = Node(
                     child_element, self.style, self.url_fetcher, parent=self,
                     unsafe=self.unsafe)
             child_preserve = child_node.get(space) == 'preserve'
             child_node.text = handle_white_spaces(child.text, child_preserve)
-            child_node.children, trailing_space = child_node.text_children(
-                child_element, trailing_space)
+            child_node.children, trailing_space = (
+                yield child_node.iter_text_children(
+                    child_element, trailing_space))
             trailing_space = child_node.text.endswith(' ')
             if original_rotate and 'rotate' not in child_node:
                 pop_rotation(child_node, original_rotate, rotate)
@@ -305,7 +789,7 @@ class Node(dict):
             if child.tail:
                 anonymous_etree = Element('{http://www.w3.org/2000/svg}tspan')
                 anonymous = Node(
-                    cssselect2.ElementWrapper.from_xml_root(anonymous_etree),
+                    type(element).from_xml_root(anonymous_etree),
                     self.style, self.url_fetcher, parent=self,
                     unsafe=self.unsafe)
                 anonymous.text = handle_white_spaces(child.tail, preserve)
@@ -325,6 +809,8 @@ class Node(dict):
 
 class Tree(Node):
     """SVG tree."""
+    __slots__ = ()
+
     def __new__(cls, **kwargs):
         tree_cache = kwargs.get('tree_cache')
         if tree_cache and kwargs.get('url'):
@@ -334,7 +820,7 @@ class Tree(Node):
             unsafe = kwargs.get('unsafe')
             if any(parsed_url[:-1]):
                 url = urlunparse(parsed_url[:-1] + ('',))
-            elif parent:
+            elif parent is not None:
                 url = parent.url
             else:
                 url = None
@@ -351,7 +837,13 @@ class Tree(Node):
         return super().__new__(cls)
 
     def __init__(self, **kwargs):
-        """Create the Tree from SVG ``text``."""
+        """Create the Tree from SVG ``text``.
+
+        The document is parsed by the ``xml_parser`` of ``XML_PARSERS``, lxml
+        when it is installed. The ``stylesheets`` given are applied after the
+        stylesheets of the document, see ``css.parse_stylesheets``.
+
+        """
         bytestring = kwargs.get('bytestring')
         file_obj = kwargs.get('file_obj')
         url = kwargs.get('url')
@@ -361,17 +853,18 @@ class Tree(Node):
         tree_cache = kwargs.get('tree_cache')
         element_id = None
 
-        self.url_fetcher = kwargs.get('url_fetcher', fetch)
+        self.document = Document(
+            None, kwargs.get('url_fetcher', fetch), unsafe,
+            None if parent is None else parent.document)
 
         if bytestring is not None:
             self.url = url
         elif file_obj is not None:
-            bytestring = file_obj.read()
             self.url = getattr(file_obj, 'name', None)
             if self.url == '<stdin>':
                 self.url = None
         elif url is not None:
-            parent_url = parent.url if parent else None
+            parent_url = parent.url if parent is not None else None
             parsed_url = parse_url(url, parent_url)
             if parsed_url.fragment:
                 self.url = urlunparse(parsed_url[:-1] + ('',))
@@ -383,35 +876,46 @@ class Tree(Node):
         else:
             raise TypeError(
                 'No input. Use one of bytestring, file_obj or url.')
-        if parent and self.url == parent.url:
+        if parent is not None and self.url == parent.url:
             root_parent = parent
-            while root_parent.parent:
+            while root_parent.parent is not None:
                 root_parent = root_parent.parent
             tree = root_parent.xml_tree
+            document = root_parent.document
+            self.document.definitions = document.definitions
         else:
-            if not bytestring:
-                bytestring = self.fetch_url(
-                    parse_url(self.url), 'image/svg+xml')
-            if len(bytestring) >= 2 and bytestring[:2] == b'\x1f\x8b':
-                bytestring = gzip.decompress(bytestring)
-            tree = ElementTree.fromstring(
-                bytestring, forbid_entities=not unsafe,
-                forbid_external=not unsafe)
+            document = self.document
+            xml_parser = XML_PARSERS[
+                kwargs.get('xml_parser') or DEFAULT_XML_PARSER]
+            if bytestring:
+                tree = xml_parser(decompress(io.BytesIO(bytestring)), unsafe)
+            elif file_obj is not None:
+                tree = xml_parser(decompress(file_obj), unsafe)
+            else:
+                with open_url(
+                        parse_url(self.url), self.url_fetcher,
+                        'image/svg+xml') as source:
+                    tree = xml_parser(decompress(source), unsafe)
+            self.document.definitions = definition_elements(tree)
         self.xml_tree = tree
-        root = cssselect2.ElementWrapper.from_xml_root(tree)
-        style = parent.style if parent else css.parse_stylesheets(self, url)
+        self.document.style = (
+            parent.style if parent is not None
+            else css.parse_stylesheets(
+                self, url, kwargs.get('stylesheets') or ()))
+        if self.style is None:
+            root = PlainElement.from_xml_root(tree)
+        else:
+            root = cssselect2.ElementWrapper.from_xml_root(tree)
         if element_id:
-            for element in root.iter_subtree():
-                if element.id == element_id:
-                    root = element
-                    self.xml_tree = element.etree_element
-                    break
-            else:
+            element = document.find(root, element_id)
+            if element is None:
                 raise TypeError(
                     'No tag with id="{}" found.'.format(element_id))
+            root = element
+            self.xml_tree = element.etree_element
         super().__init__(
-            root, style, self.url_fetcher, parent, parent_children, self.url,
-            unsafe)
+            root, self.style, self.url_fetcher, parent, parent_children,
+            self.url, unsafe)
         self.root = True
         if tree_cache is not None and self.url:
             tree_cache[(self.url, self.get('id'))] = self
@@ -19,13 +19,14 @@ Paths manager.
 
 """
 
+from array import array
 from math import pi, radians
 
 from .bounding_box import calculate_bounding_box
 from .helpers import (
-    PATH_LETTERS, clip_marker_box, node_format, normalize, point, point_angle,
-    preserve_ratio, quadratic_points, rotate, size)
-from .url import parse_url
+    CLOSE_PATH, CURVE_TO, LINE_TO, MOVE_TO, append_path, clip_marker_box,
+    node_format, preserve_ratio, quadratic_points, simplify, size)
+from .path_data import parse_path
 
 
 def draw_markers(surface, node):
@@ -34,21 +35,22 @@ def draw_markers(surface, node):
         return
 
     markers = {}
-    common_marker = parse_url(node.get('marker', '')).fragment
     for position in ('start', 'mid', 'end'):
         attribute = 'marker-{}'.format(position)
-        if attribute in node:
-            markers[position] = parse_url(node[attribute]).fragment
-        else:
-            markers[position] = common_marker
+        markers[position] = node.value(
+            attribute if attribute in node else 'marker')
+
+    vertices, node.vertices = node.vertices, []
+    if not any(markers.values()):
+        return
 
     angle1, angle2 = None, None
     position = 'start'
 
-    while node.vertices:
+    for index in range(0, len(vertices), 2):
         # Calculate position and angle
-        point = node.vertices.pop(0)
-        angles = node.vertices.pop(0) if node.vertices else None
+        point = vertices[index]
+        angles = vertices[index + 1] if index + 1 < len(vertices) else None
         if angles:
             if position == 'start':
                 angle = pi - angles[0]
@@ -134,16 +136,6 @@ def draw_markers(surface, node):
 
 def path(surface, node):
     """Draw a path ``node``."""
-    string = node.get('d', '')
-
-    node.vertices = []
-
-    for letter in PATH_LETTERS:
-        string = string.replace(letter, ' {} '.format(letter))
-
-    last_letter = None
-    string = normalize(string)
-
     # Keep the current point because Cairo's get_current_point is not accurate
     # enough. See https://github.com/Kozea/CairoSVG/issues/111.
     if surface.context.has_current_point():
@@ -152,304 +144,60 @@ def path(surface, node):
         surface.context.move_to(0, 0)
         current_point = 0, 0
 
-    while string:
-        string = string.strip()
-        if string.split(' ', 1)[0] in PATH_LETTERS:
-            letter, string = (string + ' ').split(' ', 1)
-            if last_letter in (None, 'z', 'Z') and letter not in 'mM':
-                node.vertices.append(current_point)
-                first_path_point = current_point
-        elif letter == 'M':
-            letter = 'L'
-        elif letter == 'm':
-            letter = 'l'
-
-        if last_letter in (None, 'm', 'M', 'z', 'Z'):
-            first_path_point = None
-        if letter not in (None, 'm', 'M', 'z', 'Z') and (
-                first_path_point is None):
-            first_path_point = current_point
-
-        if letter in 'aA':
-            # Elliptic curve
-            surface.context.set_tolerance(0.00001)
-            x1, y1 = current_point
-            rx, ry, string = point(surface, string)
-            rotation, string = string.split(' ', 1)
-            rotation = radians(float(rotation))
-
-            # The large and sweep values are not always separated from the
-            # following values. These flags can only be 0 or 1, so reading a
-            # single digit suffices.
-            large, string = string[0], string[1:].strip()
-            sweep, string = string[0], string[1:].strip()
-
-            # Retrieve end point and set remainder (before checking flags)
-            x3, y3, string = point(surface, string)
-
-            # Only allow 0 or 1 for flags
-            large, sweep = int(large), int(sweep)
-            if large not in (0, 1) or sweep not in (0, 1):
-                continue
-            large, sweep = bool(large), bool(sweep)
-
-            if letter == 'A':
-                # Absolute x3 and y3, convert to relative
-                x3 -= x1
-                y3 -= y1
-
-            # rx=0 or ry=0 means straight line
-            if not rx or not ry:
-                string = 'l {} {} {}'.format(x3, y3, string)
-                continue
-
-            radii_ratio = ry / rx
-
-            # Cancel the rotation of the second point
-            xe, ye = rotate(x3, y3, -rotation)
-            ye /= radii_ratio
-
-            # Find the angle between the second point and the x axis
-            angle = point_angle(0, 0, xe, ye)
-
-            # Put the second point onto the x axis
-            xe = (xe ** 2 + ye ** 2) ** .5
-            ye = 0
-
-            # Update the x radius if it is too small
-            rx = max(rx, xe / 2)
-
-            # Find one circle centre
-            xc = xe / 2
-            yc = (rx ** 2 - xc ** 2) ** .5
-
-            # Choose between the two circles according to flags
-            if not (large ^ sweep):
-                yc = -yc
-
-            # Define the arc sweep
+    path_data = parse_path(node.get('d', ''), *current_point)
+    node.vertices = list(path_data.vertices)
+
+    segments = path_data.segments
+    if surface.simplify:
+        # Markers are drawn on the original vertices
+        segments = simplify_lines(surface, segments, *current_point)
+
+    data = array('d')
+    for segment in segments:
+        segment_type = segment[0]
+        if segment_type == 'L':
+            data.extend((LINE_TO, 0) + segment[1:])
+        elif segment_type == 'C':
+            data.extend((CURVE_TO, 0) + segment[1:])
+        elif segment_type == 'M':
+            data.extend((MOVE_TO, 0) + segment[1:])
+        elif segment_type == 'Q':
+            data.extend((CURVE_TO, 0) + quadratic_points(
+                *(current_point + segment[1:])))
+        elif segment_type == 'A':
+            # Arcs are drawn by Cairo, send the path built so far
+            append_path(surface, data)
+            data = array('d')
+            (rotation, large, sweep, xc, yc, radius, angle1, angle2,
+             radii_ratio) = segment[3:12]
             arc = (
                 surface.context.arc if sweep else surface.context.arc_negative)
-
-            # Put the second point and the center back to their positions
-            xe, ye = rotate(xe, 0, angle)
-            xc, yc = rotate(xc, yc, angle)
-
-            # Find the drawing angles
-            angle1 = point_angle(xc, yc, 0, 0)
-            angle2 = point_angle(xc, yc, xe, ye)
-
-            # Store the tangent angles
-            node.vertices.append((-angle1, -angle2))
-
-            # Draw the arc
+            if surface.tolerance is None:
+                surface.context.set_tolerance(0.00001)
             surface.context.save()
-            surface.context.translate(x1, y1)
+            surface.context.translate(*current_point)
             surface.context.rotate(rotation)
             surface.context.scale(1, radii_ratio)
-            arc(xc, yc, rx, angle1, angle2)
+            arc(xc, yc, radius, angle1, angle2)
             surface.context.restore()
-            current_point = current_point[0] + x3, current_point[1] + y3
-
-        elif letter == 'c':
-            # Relative curve
-            x, y = current_point
-            x1, y1, string = point(surface, string)
-            x2, y2, string = point(surface, string)
-            x3, y3, string = point(surface, string)
-            node.vertices.append((
-                point_angle(x2, y2, x1, y1), point_angle(x2, y2, x3, y3)))
-            surface.context.rel_curve_to(x1, y1, x2, y2, x3, y3)
-            current_point = current_point[0] + x3, current_point[1] + y3
-
-            # Save absolute values for x and y, useful if next letter is s or S
-            x1 += x
-            x2 += x
-            x3 += x
-            y1 += y
-            y2 += y
-            y3 += y
-
-        elif letter == 'C':
-            # Curve
-            x1, y1, string = point(surface, string)
-            x2, y2, string = point(surface, string)
-            x3, y3, string = point(surface, string)
-            node.vertices.append((
-                point_angle(x2, y2, x1, y1), point_angle(x2, y2, x3, y3)))
-            surface.context.curve_to(x1, y1, x2, y2, x3, y3)
-            current_point = x3, y3
-
-        elif letter == 'h':
-            # Relative horizontal line
-            x, string = (string + ' ').split(' ', 1)
-            old_x, old_y = current_point
-            angle = 0 if size(surface, x, 'x') > 0 else pi
-            node.vertices.append((pi - angle, angle))
-            x = size(surface, x, 'x')
-            surface.context.rel_line_to(x, 0)
-            current_point = current_point[0] + x, current_point[1]
-
-        elif letter == 'H':
-            # Horizontal line
-            x, string = (string + ' ').split(' ', 1)
-            old_x, old_y = current_point
-            angle = 0 if size(surface, x, 'x') > old_x else pi
-            node.vertices.append((pi - angle, angle))
-            x = size(surface, x, 'x')
-            surface.context.line_to(x, old_y)
-            current_point = x, current_point[1]
-
-        elif letter == 'l':
-            # Relative straight line
-            x, y, string = point(surface, string)
-            angle = point_angle(0, 0, x, y)
-            node.vertices.append((pi - angle, angle))
-            surface.context.rel_line_to(x, y)
-            current_point = current_point[0] + x, current_point[1] + y
-
-        elif letter == 'L':
-            # Straight line
-            x, y, string = point(surface, string)
-            old_x, old_y = current_point
-            angle = point_angle(old_x, old_y, x, y)
-            node.vertices.append((pi - angle, angle))
-            surface.context.line_to(x, y)
-            current_point = x, y
-
-        elif letter == 'm':
-            # Current point relative move
-            x, y, string = point(surface, string)
-            surface.context.rel_move_to(x, y)
-            current_point = current_point[0] + x, current_point[1] + y
-
-        elif letter == 'M':
-            # Current point move
-            x, y, string = point(surface, string)
-            surface.context.move_to(x, y)
-            current_point = x, y
-
-        elif letter == 'q':
-            # Relative quadratic curve
-            x1, y1 = 0, 0
-            x2, y2, string = point(surface, string)
-            x3, y3, string = point(surface, string)
-            xq1, yq1, xq2, yq2, xq3, yq3 = quadratic_points(
-                x1, y1, x2, y2, x3, y3)
-            surface.context.rel_curve_to(xq1, yq1, xq2, yq2, xq3, yq3)
-            node.vertices.append((0, 0))
-            current_point = current_point[0] + x3, current_point[1] + y3
-
-        elif letter == 'Q':
-            # Quadratic curve
-            x1, y1 = current_point
-            x2, y2, string = point(surface, string)
-            x3, y3, string = point(surface, string)
-            xq1, yq1, xq2, yq2, xq3, yq3 = quadratic_points(
-                x1, y1, x2, y2, x3, y3)
-            surface.context.curve_to(xq1, yq1, xq2, yq2, xq3, yq3)
-            node.vertices.append((0, 0))
-            current_point = x3, y3
-
-        elif letter == 's':
-            # Relative smooth curve
-            x, y = current_point
-            x1 = x3 - x2 if last_letter in 'csCS' else 0
-            y1 = y3 - y2 if last_letter in 'csCS' else 0
-            x2, y2, string = point(surface, string)
-            x3, y3, string = point(surface, string)
-            node.vertices.append((
-                point_angle(x2, y2, x1, y1), point_angle(x2, y2, x3, y3)))
-            surface.context.rel_curve_to(x1, y1, x2, y2, x3, y3)
-            current_point = current_point[0] + x3, current_point[1] + y3
-
-            # Save absolute values for x and y, useful if next letter is s or S
-            x1 += x
-            x2 += x
-            x3 += x
-            y1 += y
-            y2 += y
-            y3 += y
-
-        elif letter == 'S':
-            # Smooth curve
-            x, y = current_point
-            x1 = x3 + (x3 - x2) if last_letter in 'csCS' else x
-            y1 = y3 + (y3 - y2) if last_letter in 'csCS' else y
-            x2, y2, string = point(surface, string)
-            x3, y3, string = point(surface, string)
-            node.vertices.append((
-                point_angle(x2, y2, x1, y1), point_angle(x2, y2, x3, y3)))
-            surface.context.curve_to(x1, y1, x2, y2, x3, y3)
-            current_point = x3, y3
-
-        elif letter == 't':
-            # Relative quadratic curve end
-            if last_letter not in 'QqTt':
-                x2, y2, x3, y3 = 0, 0, 0, 0
-            elif last_letter in 'QT':
-                x2 -= x1
-                y2 -= y1
-                x3 -= x1
-                y3 -= y1
-            x2 = x3 - x2
-            y2 = y3 - y2
-            x1, y1 = 0, 0
-            x3, y3, string = point(surface, string)
-            xq1, yq1, xq2, yq2, xq3, yq3 = quadratic_points(
-                x1, y1, x2, y2, x3, y3)
-            node.vertices.append((0, 0))
-            surface.context.rel_curve_to(xq1, yq1, xq2, yq2, xq3, yq3)
-            current_point = current_point[0] + x3, current_point[1] + y3
-
-        elif letter == 'T':
-            # Quadratic curve end
-            abs_x, abs_y = current_point
-            if last_letter not in 'QqTt':
-                x2, y2, x3, y3 = abs_x, abs_y, abs_x, abs_y
-            elif last_letter in 'qt':
-                x2 += abs_x
-                y2 += abs_y
-                x3 += abs_x
-                y3 += abs_y
-            x2 = abs_x + (x3 - x2)
-            y2 = abs_y + (y3 - y2)
-            x1, y1 = abs_x, abs_y
-            x3, y3, string = point(surface, string)
-            xq1, yq1, xq2, yq2, xq3, yq3 = quadratic_points(
-                x1, y1, x2, y2, x3, y3)
-            node.vertices.append((0, 0))
-            surface.context.curve_to(xq1, yq1, xq2, yq2, xq3, yq3)
-            current_point = x3, y3
-
-        elif letter == 'v':
-            # Relative vertical line
-            y, string = (string + ' ').split(' ', 1)
-            old_x, old_y = current_point
-            angle = pi / 2 if size(surface, y, 'y') > 0 else -pi / 2
-            node.vertices.append((-angle, angle))
-            y = size(surface, y, 'y')
-            surface.context.rel_line_to(0, y)
-            current_point = current_point[0], current_point[1] + y
-
-        elif letter == 'V':
-            # Vertical line
-            y, string = (string + ' ').split(' ', 1)
-            old_x, old_y = current_point
-            angle = pi / 2 if size(surface, y, 'y') > 0 else -pi / 2
-            node.vertices.append((-angle, angle))
-            y = size(surface, y, 'y')
-            surface.context.line_to(old_x, y)
-            current_point = current_point[0], y
-
-        elif letter in 'zZ':
-            # End of path
-            node.vertices.append(None)
-            surface.context.close_path()
-            current_point = first_path_point or (0, 0)
-
-        if letter not in 'zZ':
-            node.vertices.append(current_point)
-
-        string = string.strip()
-        last_letter = letter
+        elif segment_type == 'Z':
+            data.extend((CLOSE_PATH, 0))
+        current_point = segment[-2:]
+    append_path(surface, data)
+
+
+def simplify_lines(surface, segments, x, y):
+    """Simplify the runs of lines in ``segments`` drawn from ``(x, y)``."""
+    simplified = []
+    xs, ys = [x], [y]
+    # The last move is only used to simplify the last run of lines
+    for segment in segments + (('M', None, None),):
+        if segment[0] == 'L':
+            xs.append(segment[1])
+            ys.append(segment[2])
+            continue
+        xs, ys = simplify(surface, xs, ys)
+        simplified.extend(('L', x, y) for x, y in zip(xs[1:], ys[1:]))
+        simplified.append(segment)
+        xs, ys = [segment[-2]], [segment[-1]]
+    return simplified[:-1]
@@ -0,0 +1,284 @@
+# This file is part of CairoSVG
+# Copyright © 2010-2018 Kozea
+#
+# This library is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with CairoSVG.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Path data intermediate representation.
+
+Path data are parsed once into absolute segments, used to draw paths, to place
+their markers and to calculate their bounding boxes.
+
+Segments are tuples whose first item is the segment type and whose last two
+items are the absolute coordinates of the end point:
+
+- ``('M', x, y)``: move to,
+- ``('L', x, y)``: line to,
+- ``('C', x1, y1, x2, y2, x, y)``: cubic Bézier curve,
+- ``('Q', x1, y1, x, y)``: quadratic Bézier curve,
+- ``('A', rx, ry, rotation, large, sweep, xc, yc, radius, angle1, angle2,
+  radii_ratio, x, y)``: elliptical arc, with its endpoint parameters and the
+  center of the circle drawn in a coordinate system rotated by ``rotation``
+  and scaled by ``radii_ratio`` along the y axis,
+- ``('Z', x, y)``: close path, ``(x, y)`` being the start of the subpath.
+
+``points`` are the indices of the points in ``vertices``, the other vertices
+are tangent angles.
+
+"""
+
+import re
+from collections import namedtuple
+from math import pi, radians
+
+from .helpers import PATH_LETTER, LRUCache, path_commands, point_angle, rotate
+
+PathData = namedtuple('PathData', ('segments', 'vertices', 'points'))
+
+# Parsed "d" attributes drawn from the origin, see ``parse_path``. The cache
+# keeps at most 100000 segments, longer paths are not stored.
+PATH_CACHE = LRUCache(
+    1024, weight=lambda path_data: len(path_data.segments), maxweight=100000)
+
+ABSOLUTE_COMMAND = re.compile('[ACHLMQSTV]')
+
+
+def parse_path(string, x=0, y=0):
+    """Return the ``PathData`` of ``string`` drawn from ``(x, y)``.
+
+    Path data are parsed once from the origin and stored in ``PATH_CACHE``.
+    The start point is ignored when the path begins with an absolute move,
+    relative paths are translated to their start point.
+
+    """
+    if x or y:
+        match = PATH_LETTER.match(string)
+        if not match or match.group(1) != 'M':
+            if ABSOLUTE_COMMAND.search(string):
+                # Absolute commands following relative ones depend on the
+                # start point, don't cache these rare paths
+                return build_path(string, x, y)
+            return translate_path(PATH_CACHE.get(string, build_path), x, y)
+    return PATH_CACHE.get(string, build_path)
+
+
+def translate_path(path_data, x, y):
+    """Translate the ``PathData`` of a relative path by ``(x, y)``."""
+    segments = []
+    for segment in path_data.segments:
+        if segment[0] == 'A':
+            # The center of the arc is relative to its start
+            segments.append(segment[:-2] + (segment[-2] + x, segment[-1] + y))
+        else:
+            segments.append((segment[0],) + tuple(
+                value + (y if index % 2 else x)
+                for index, value in enumerate(segment[1:])))
+    vertices = list(path_data.vertices)
+    for index in path_data.points:
+        point_x, point_y = vertices[index]
+        vertices[index] = point_x + x, point_y + y
+    return PathData(tuple(segments), tuple(vertices), path_data.points)
+
+
+def build_path(string, x=0, y=0):
+    """Build the ``PathData`` of ``string`` drawn from ``(x, y)``.
+
+    Vertices are the points and tangent angles used to draw markers, see
+    ``path.draw_markers``.
+
+    """
+    segments = []
+    vertices = []
+    points = []
+    current_point = subpath_start = x, y
+    curve_control = quadratic_control = None
+    last_letter = None
+
+    for letter, arguments in path_commands(string):
+        x0, y0 = current_point
+
+        if letter in 'aA':
+            rx, ry, rotation, large, sweep, x3, y3 = arguments
+
+            # Only allow 0 or 1 for flags
+            if large not in (0, 1) or sweep not in (0, 1):
+                continue
+
+            if letter == 'A':
+                # Absolute x3 and y3, convert to relative
+                x3 -= x0
+                y3 -= y0
+
+            # rx=0 or ry=0 means straight line
+            if not rx or not ry:
+                letter, arguments = 'l', (x3, y3)
+
+        if last_letter in (None, 'z', 'Z') and letter not in 'mM':
+            points.append(len(vertices))
+            vertices.append(current_point)
+
+        if letter in 'aA':
+            # Elliptic curve
+            large, sweep = bool(large), bool(sweep)
+            rotation = radians(rotation)
+            radii_ratio = ry / rx
+
+            # Cancel the rotation of the second point
+            xe, ye = rotate(x3, y3, -rotation)
+            ye /= radii_ratio
+
+            # Find the angle between the second point and the x axis
+            angle = point_angle(0, 0, xe, ye)
+
+            # Put the second point onto the x axis
+            xe = (xe ** 2 + ye ** 2) ** .5
+            ye = 0
+
+            # Update the x radius if it is too small
+            radius = max(rx, xe / 2)
+
+            # Find one circle centre
+            xc = xe / 2
+            yc = (radius ** 2 - xc ** 2) ** .5
+
+            # Choose between the two circles according to flags
+            if not (large ^ sweep):
+                yc = -yc
+
+            # Put the second point and the center back to their positions
+            xe, ye = rotate(xe, 0, angle)
+            xc, yc = rotate(xc, yc, angle)
+
+            # Find the drawing angles
+            angle1 = point_angle(xc, yc, 0, 0)
+            angle2 = point_angle(xc, yc, xe, ye)
+
+            # Store the tangent angles
+            vertices.append((-angle1, -angle2))
+
+            current_point = x0 + x3, y0 + y3
+            segments.append((
+                'A', rx, ry, rotation, large, sweep, xc, yc, radius, angle1,
+                angle2, radii_ratio) + current_point)
+
+        elif letter in 'cC':
+            # Curve
+            x1, y1, x2, y2, x3, y3 = arguments
+            vertices.append((
+                point_angle(x2, y2, x1, y1), point_angle(x2, y2, x3, y3)))
+            if letter == 'c':
+                # Relative curve, convert to absolute
+                x1, x2, x3 = x1 + x0, x2 + x0, x3 + x0
+                y1, y2, y3 = y1 + y0, y2 + y0, y3 + y0
+            curve_control = x2, y2
+            current_point = x3, y3
+            segments.append(('C', x1, y1, x2, y2, x3, y3))
+
+        elif letter in 'hH':
+            # Horizontal line
+            x, = arguments
+            if letter == 'h':
+                x += x0
+            angle = 0 if x > x0 else pi
+            vertices.append((pi - angle, angle))
+            current_point = x, y0
+            segments.append(('L',) + current_point)
+
+        elif letter in 'lL':
+            # Straight line
+            x, y = arguments
+            if letter == 'l':
+                x += x0
+                y += y0
+            angle = point_angle(x0, y0, x, y)
+            vertices.append((pi - angle, angle))
+            current_point = x, y
+            segments.append(('L', x, y))
+
+        elif letter in 'mM':
+            # Current point move
+            x, y = arguments
+            if letter == 'm':
+                x += x0
+                y += y0
+            current_point = subpath_start = x, y
+            segments.append(('M', x, y))
+
+        elif letter in 'qQ':
+            # Quadratic curve
+            x1, y1, x3, y3 = arguments
+            if letter == 'q':
+                x1, x3 = x1 + x0, x3 + x0
+                y1, y3 = y1 + y0, y3 + y0
+            vertices.append((0, 0))
+            quadratic_control = x1, y1
+            current_point = x3, y3
+            segments.append(('Q', x1, y1, x3, y3))
+
+        elif letter in 'sS':
+            # Smooth curve
+            if last_letter and last_letter in 'csCS':
+                x1 = 2 * x0 - curve_control[0]
+                y1 = 2 * y0 - curve_control[1]
+            else:
+                x1, y1 = x0, y0
+            x2, y2, x3, y3 = arguments
+            if letter == 's':
+                x2, x3 = x2 + x0, x3 + x0
+                y2, y3 = y2 + y0, y3 + y0
+            vertices.append((
+                point_angle(x2, y2, x1, y1), point_angle(x2, y2, x3, y3)))
+            curve_control = x2, y2
+            current_point = x3, y3
+            segments.append(('C', x1, y1, x2, y2, x3, y3))
+
+        elif letter in 'tT':
+            # Quadratic curve end
+            if last_letter and last_letter in 'qtQT':
+                x1 = 2 * x0 - quadratic_control[0]
+                y1 = 2 * y0 - quadratic_control[1]
+            else:
+                x1, y1 = x0, y0
+            x3, y3 = arguments
+            if letter == 't':
+                x3 += x0
+                y3 += y0
+            vertices.append((0, 0))
+            quadratic_control = x1, y1
+            current_point = x3, y3
+            segments.append(('Q', x1, y1, x3, y3))
+
+        elif letter in 'vV':
+            # Vertical line
+            y, = arguments
+            if letter == 'v':
+                y += y0
+            angle = pi / 2 if y > y0 else -pi / 2
+            vertices.append((-angle, angle))
+            current_point = x0, y
+            segments.append(('L',) + current_point)
+
+        elif letter in 'zZ':
+            # End of path
+            vertices.append(None)
+            current_point = subpath_start
+            segments.append(('Z',) + current_point)
+
+        if letter not in 'zZ':
+            points.append(len(vertices))
+            vertices.append(current_point)
+
+        last_letter = letter
+
+    return PathData(tuple(segments), tuple(vertices), tuple(points))
@@ -0,0 +1,106 @@
+# This file is part of CairoSVG
+# Copyright © 2010-2018 Kozea
+#
+# This library is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with CairoSVG.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Typed values of node properties.
+
+Properties are converted once and cached by nodes, see ``parser.Node.value``.
+Conversions of common strings are also shared by the nodes.
+Lengths depend on the surface, they are stored as ``(number, unit)`` tokens
+that ``helpers.number_size`` converts when drawing.
+
+"""
+
+from functools import lru_cache
+
+from .colors import color
+from .helpers import clip_rect, numbers, paint
+from .url import parse_url
+
+# Tags of the container elements, whose children may be streamed
+CONTAINER_TAGS = frozenset(('a', 'g', 'svg', 'switch', 'symbol'))
+
+
+@lru_cache(maxsize=1024)
+def length(string):
+    """Return the ``(number, unit)`` token of a size, see ``helpers.size``."""
+    if not string:
+        return 0, ''
+
+    try:
+        return float(string), ''
+    except ValueError:
+        pass
+
+    tokens = numbers(string)
+    if tokens and tokens[0][1]:
+        return tokens[0]
+
+    return 0, ''
+
+
+def fragment(name):
+    """Return a function getting the URL fragment of the ``name`` property."""
+    return lambda node: parse_url(node.get(name)).fragment
+
+
+def has_children(node):
+    """Return whether the opacity of ``node`` is applied to its children.
+
+    Containers always group their children: the children of streamed groups
+    are generators, that are true even when they yield nothing.
+
+    """
+    return node.tag in CONTAINER_TAGS or bool(node.children)
+
+
+def opacity(node, name):
+    """Get the opacity ``name`` of ``node``, including the group opacity."""
+    value = float(node.get(name, 1))
+    if node.value('opacity') < 1 and not has_children(node):
+        value *= node.value('opacity')
+    return value
+
+
+PROPERTIES = {
+    'clip': lambda node: clip_rect(node.get('clip')),
+    'clip-path': fragment('clip-path'),
+    'fill': lambda node: paint(node.get('fill', 'black')),
+    'fill-color': lambda node: color(
+        node.value('fill')[1], opacity(node, 'fill-opacity')),
+    'filter': fragment('filter'),
+    'flood-color': lambda node: color(
+        paint(node.get('flood-color'))[1],
+        float(node.get('flood-opacity', 1))),
+    'font-size': lambda node: length(node.get('font-size', '12pt')),
+    'marker': fragment('marker'),
+    'marker-end': fragment('marker-end'),
+    'marker-mid': fragment('marker-mid'),
+    'marker-start': fragment('marker-start'),
+    'mask': fragment('mask'),
+    'opacity': lambda node: float(node.get('opacity', 1)),
+    'stop-color': lambda node: color(
+        node.get('stop-color', 'black'), float(node.get('stop-opacity', 1))),
+    'stroke': lambda node: paint(node.get('stroke')),
+    'stroke-color': lambda node: color(
+        node.value('stroke')[1], opacity(node, 'stroke-opacity')),
+    'stroke-dasharray': lambda node: numbers(
+        node.get('stroke-dasharray', '')),
+    'stroke-dashoffset': lambda node: length(node.get('stroke-dashoffset')),
+    'stroke-miterlimit': lambda node: float(
+        node.get('stroke-miterlimit', 4)),
+    'stroke-width': lambda node: length(node.get('stroke-width', '1')),
+}
@@ -19,9 +19,12 @@ Shapes drawers.
 
 """
 
+from array import array
 from math import pi
 
-from .helpers import normalize, point, point_angle, size
+from .helpers import (
+    CLOSE_PATH, CURVE_TO, LINE_TO, MOVE_TO, PointError, append_path, numpy,
+    point_angle, points, simplify, size)
 
 
 def circle(surface, node):
@@ -72,18 +75,44 @@ def polygon(surface, node):
 
 def polyline(surface, node):
     """Draw a polyline ``node``."""
-    points = normalize(node.get('points', ''))
-    if points:
-        x, y, points = point(surface, points)
-        surface.context.move_to(x, y)
-        node.vertices = [(x, y)]
-        while points:
-            x_old, y_old = x, y
-            x, y, points = point(surface, points)
-            angle = point_angle(x_old, y_old, x, y)
-            node.vertices.append((pi - angle, angle))
-            surface.context.line_to(x, y)
-            node.vertices.append((x, y))
+    coordinates = points(surface, node.get('points', ''))
+    count = len(coordinates) // 2
+    if count:
+        xs = coordinates[0:2 * count:2]
+        ys = coordinates[1:2 * count:2]
+
+        # Points and angles of the segments between them
+        if numpy is None:
+            angles = [
+                point_angle(x1, y1, x2, y2) for x1, y1, x2, y2
+                in zip(xs, ys, xs[1:], ys[1:])]
+            vertices = zip(xs, ys)
+        else:
+            angles = numpy.arctan2(numpy.diff(ys), numpy.diff(xs)).tolist()
+            vertices = zip(xs.tolist(), ys.tolist())
+        node.vertices = [None] * (2 * count - 1)
+        node.vertices[0::2] = vertices
+        node.vertices[1::2] = ((pi - angle, angle) for angle in angles)
+
+        if surface.simplify:
+            # Markers are drawn on the original points
+            xs, ys = simplify(surface, xs, ys)
+            count = len(xs)
+
+        if numpy is None:
+            data = array('d', (LINE_TO, 0, 0, 0)) * count
+            data[2::4], data[3::4] = array('d', xs), array('d', ys)
+        else:
+            data = numpy.zeros((count, 4))
+            data[:, 0] = LINE_TO
+            data[:, 2], data[:, 3] = xs, ys
+            data = data.ravel()
+        data[0] = MOVE_TO
+        append_path(surface, data)
+
+    if len(coordinates) % 2:
+        # Draw the valid points even if the last one is invalid
+        raise PointError
 
 
 def rect(surface, node):
@@ -115,13 +144,17 @@ def rect(surface, node):
         c2 = ARC_TO_BEZIER * ry
 
         surface.context.new_path()
-        surface.context.move_to(x + rx, y)
-        surface.context.rel_line_to(width - 2 * rx, 0)
-        surface.context.rel_curve_to(c1, 0, rx, c2, rx, ry)
-        surface.context.rel_line_to(0, height - 2 * ry)
-        surface.context.rel_curve_to(0, c2, c1 - rx, ry, -rx, ry)
-        surface.context.rel_line_to(-width + 2 * rx, 0)
-        surface.context.rel_curve_to(-c1, 0, -rx, -c2, -rx, -ry)
-        surface.context.rel_line_to(0, -height + 2 * ry)
-        surface.context.rel_curve_to(0, -c2, rx - c1, -ry, rx, -ry)
-        surface.context.close_path()
+        append_path(surface, array('d', (
+            MOVE_TO, 0, x + rx, y,
+            LINE_TO, 0, x + width - rx, y,
+            CURVE_TO, 0, x + width - rx + c1, y, x + width, y + c2,
+            x + width, y + ry,
+            LINE_TO, 0, x + width, y + height - ry,
+            CURVE_TO, 0, x + width, y + height - ry + c2,
+            x + width - rx + c1, y + height, x + width - rx, y + height,
+            LINE_TO, 0, x + rx, y + height,
+            CURVE_TO, 0, x + rx - c1, y + height, x, y + height - c2,
+            x, y + height - ry,
+            LINE_TO, 0, x, y + ry,
+            CURVE_TO, 0, x, y + ry - c2, x + rx - c1, y, x + rx, y,
+            CLOSE_PATH, 0)))
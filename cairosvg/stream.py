@@ -0,0 +1,330 @@
+# This file is part of CairoSVG
+# Copyright © 2010-2018 Kozea
+#
+# This library is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with CairoSVG.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Streaming renderer.
+
+Streamed documents are drawn while they are parsed. The children of the root
+and of groups are drawn as soon as they are parsed, and are released once
+drawn. Other elements are drawn when their whole subtree is parsed.
+
+Documents needing lookahead raise ``StreamError`` while they are drawn, they
+are then drawn again without streaming, see ``surface.Surface.convert``. These
+documents include forward references, references to elements already
+released, stylesheets after content and selectors depending on following
+elements.
+
+"""
+
+import io
+import re
+from itertools import chain
+
+import cssselect2
+from defusedxml import ElementTree
+
+from . import css
+from .defs import parse_all_defs
+from .features import match_features
+from .parser import Document, Node, Tree, decompress, definition_elements
+from .url import fetch, open_url, parse_url
+
+# Selectors and rules that can't be matched while the document is parsed,
+# including selectors needing the previous siblings released while streaming
+LOOKAHEAD_CSS = re.compile(
+    r':(last-|only-|nth-last-|empty|first-of-type|nth-of-type|'
+    r'nth-child\([^)]*\bof\b)|~(?!=)', re.IGNORECASE)
+
+URL_REFERENCE = re.compile(r'url\(\s*[\'"]?#([^\'")\s]+)')
+
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+SVG_NAMESPACE = '{http://www.w3.org/2000/svg}'
+
+STYLE_TAG = SVG_NAMESPACE + 'style'
+
+# Elements that can be found before stylesheets, they are not drawn
+PRELUDE_TAGS = tuple(
+    SVG_NAMESPACE + tag for tag in ('desc', 'metadata', 'style', 'title'))
+
+# Elements that are not drawn but can be referenced, they are never released
+KEPT_TAGS = tuple(SVG_NAMESPACE + tag for tag in ('defs', 'symbol'))
+
+
+class StreamError(Exception):
+    """Exception raised when a document can't be streamed."""
+
+
+def open_source(bytestring, file_obj, url, url_fetcher):
+    """Return a file-like object reading the SVG source, and its URL.
+
+    The object opened to read the ``url``, if any, is also returned, it has to
+    be closed once the source is parsed.
+
+    """
+    opened = None
+    if bytestring is not None:
+        source = io.BytesIO(bytestring)
+    elif file_obj is not None:
+        source = file_obj
+        url = getattr(file_obj, 'name', None)
+        if url == '<stdin>':
+            url = None
+    elif url is not None:
+        parsed_url = parse_url(url)
+        if parsed_url.fragment:
+            raise StreamError('Documents fragments are not streamed')
+        url = parsed_url.geturl() or None
+        source = opened = open_url(parsed_url, url_fetcher, 'image/svg+xml')
+    else:
+        raise TypeError('No input. Use one of bytestring, file_obj or url.')
+    return decompress(source), url, opened
+
+
+def references(items):
+    """Yield the ids of the elements referenced by ``(key, value)`` items."""
+    for key, value in items:
+        if not isinstance(value, str):
+            continue
+        if key == XLINK_HREF:
+            if value.startswith('#'):
+                yield value[1:]
+        else:
+            yield from URL_REFERENCE.findall(value)
+
+
+class StreamDocument(Document):
+    """Context shared by the nodes of a streamed document.
+
+    Elements are not indexed by id, as they are added and removed while the
+    document is drawn.
+
+    """
+    __slots__ = ()
+
+    def find(self, root, element_id):
+        """Get the cssselect2 element with ``element_id`` in ``root``.
+
+        Each call walks the elements of ``root`` still in memory, that is the
+        definitions, the symbols and the ancestors of the drawn element, as
+        the other elements are released once drawn.
+
+        """
+        for element in root.iter_subtree():
+            if element.id == element_id:
+                return element
+
+
+class StreamTree(Tree):
+    """SVG tree drawn while it is parsed.
+
+    The children of the tree are given by a generator, they are parsed while
+    the surface draws them.
+
+    """
+    __slots__ = ('surface', '_events', '_opened', '_seen', '_released')
+
+    def __init__(self, **kwargs):
+        """Parse the SVG source until its first drawn element."""
+        unsafe = kwargs.get('unsafe')
+        self.document = StreamDocument(
+            None, kwargs.get('url_fetcher', fetch), unsafe)
+        source, self.url, self._opened = open_source(
+            kwargs.get('bytestring'), kwargs.get('file_obj'),
+            kwargs.get('url'), self.url_fetcher)
+        self.surface = None
+        self._seen = set()
+        self._released = set()
+        self._events = iter(ElementTree.iterparse(
+            source, events=('start', 'end'), forbid_entities=not unsafe,
+            forbid_external=not unsafe))
+        try:
+            self.parse_prelude(unsafe, kwargs.get('stylesheets') or ())
+        except StreamError:
+            self.close()
+            raise
+
+    def parse_prelude(self, unsafe, stylesheets):
+        """Parse the root, the stylesheets and the elements before them."""
+        # Find the root and the stylesheets before the drawn elements
+        _, self.xml_tree = next(self._events)
+        self.add_id(self.xml_tree)
+        prelude = []
+        for event, element in self._events:
+            if event == 'start' and element.tag in PRELUDE_TAGS:
+                self.add_id(element)
+                self.skip(element, style=True)
+                prelude.append(element)
+            else:
+                self._events = chain([(event, element)], self._events)
+                break
+        texts = [
+            element.text for element in prelude
+            if element.tag == STYLE_TAG and element.text]
+        texts.extend(stylesheet.text for stylesheet in stylesheets)
+        if any(LOOKAHEAD_CSS.search(text) for text in texts):
+            raise StreamError('Stylesheets need lookahead')
+        self.document.style = css.parse_stylesheets(
+            self, self.url, stylesheets)
+
+        root = cssselect2.ElementWrapper.from_xml_root(self.xml_tree)
+        super(Tree, self).__init__(
+            root, self.style, self.url_fetcher, url=self.url, unsafe=unsafe)
+        self.root = True
+        self.check_references(self)
+
+        # Children found before the drawn elements are created now
+        children = []
+        previous = None
+        for index, element in enumerate(prelude):
+            previous = cssselect2.ElementWrapper(
+                element, parent=root, index=index, previous=previous,
+                in_html_document=False)
+            children.append(Node(
+                previous, self.style, self.url_fetcher, parent=self,
+                unsafe=unsafe))
+        if previous is not None:
+            previous.previous = None
+        self.children = chain(children, self.stream_root(
+            root, len(children), previous))
+
+    def close(self):
+        """Close the object opened to read the source, if any."""
+        if self._opened is not None:
+            self._opened.close()
+            self._opened = None
+
+    def stream_root(self, root, index, previous):
+        """Yield the children of the tree, close the source once parsed."""
+        try:
+            yield from self.stream_children(self, root, index, previous)
+        finally:
+            self.close()
+
+    def add_id(self, element):
+        """Store the id of the parsed ``element``."""
+        if 'id' in element.attrib:
+            self._seen.add(element.attrib['id'])
+
+    def skip(self, element, style=False):
+        """Parse the source until the end of ``element``.
+
+        Stylesheets raise ``StreamError``, unless ``style`` is ``True``.
+
+        """
+        for event, child in self._events:
+            if event == 'end':
+                if child is element:
+                    return
+            else:
+                if child.tag == STYLE_TAG and not style:
+                    raise StreamError('Stylesheet found after content')
+                self.add_id(child)
+
+    def release(self, parent, element):
+        """Release the drawn ``element``, unless it can be referenced."""
+        if element.tag in KEPT_TAGS or definition_elements(element):
+            return
+        for child in element.iter():
+            if 'id' in child.attrib:
+                self._released.add(child.attrib['id'])
+        parent.remove(element)
+
+    def check_ids(self, element_ids):
+        """Raise ``StreamError`` if some elements are not available."""
+        for element_id in element_ids:
+            if element_id not in self._seen or element_id in self._released:
+                raise StreamError(
+                    'Element "{}" is not available'.format(element_id))
+
+    def check_references(self, node, recursive=False):
+        """Raise ``StreamError`` if ``node`` references missing elements.
+
+        The attributes are checked before creating the node, this method
+        checks the declarations given by stylesheets.
+
+        """
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            self.check_ids(references(node.declarations.items()))
+            if recursive:
+                nodes.extend(node.children)
+
+    def stream_children(self, node, element, index=0, previous=None):
+        """Yield the children of ``node`` as soon as they are parsed.
+
+        ``element`` is the cssselect2 element of ``node``, ``index`` and
+        ``previous`` are the index and the wrapper of the next child and of
+        its previous sibling.
+
+        """
+        for event, child_element in self._events:
+            if event == 'end':
+                # End of the node
+                return
+
+            self.add_id(child_element)
+            if child_element.tag == STYLE_TAG:
+                raise StreamError('Stylesheet found after content')
+            if not match_features(child_element):
+                self.skip(child_element)
+                self.release(element.etree_element, child_element)
+                index += 1
+                continue
+
+            # Only keep the previous sibling needed by "+" combinators, and
+            # don't keep the list of the children already released
+            if previous is not None:
+                previous.previous = None
+            vars(element).pop('etree_children', None)
+            wrapper = previous = cssselect2.ElementWrapper(
+                child_element, parent=element, index=index, previous=previous,
+                in_html_document=False)
+            index += 1
+
+            if child_element.tag == SVG_NAMESPACE + 'g':
+                self.check_ids(references(child_element.attrib.items()))
+                child = Node(
+                    wrapper, self.style, self.url_fetcher, parent=node,
+                    unsafe=self.unsafe)
+                if not child.value('filter') and not child.value('mask'):
+                    # Stream the children of the group, the group can't be
+                    # referenced as its children are released while drawn
+                    self.check_references(child)
+                    if 'id' in child_element.attrib:
+                        self._released.add(child_element.attrib['id'])
+                    child.children = self.stream_children(child, wrapper)
+                    yield child
+                    for _ in child.children:
+                        # Children not drawn, parse them anyway, each child
+                        # is parsed once whether it is drawn or not
+                        pass
+                    self.release(element.etree_element, child_element)
+                    continue
+                self.skip(child_element)
+            else:
+                self.skip(child_element)
+                for descendant in child_element.iter():
+                    self.check_ids(references(descendant.attrib.items()))
+                child = Node(
+                    wrapper, self.style, self.url_fetcher, parent=node,
+                    unsafe=self.unsafe)
+
+            parse_all_defs(self.surface, child)
+            self.check_references(child, recursive=True)
+            yield child
+            self.release(element.etree_element, child_element)
@@ -23,21 +23,21 @@ import io
 
 import cairocffi as cairo
 
-from .colors import color
 from .defs import (
     apply_filter_after_painting, apply_filter_before_painting, clip_path,
     filter_, gradient_or_pattern, linear_gradient, marker, mask, paint_mask,
     parse_all_defs, pattern, prepare_filter, radial_gradient, use)
 from .helpers import (
-    UNITS, PointError, apply_matrix_transform, clip_rect, node_format,
-    normalize, paint, preserved_ratio, size, transform)
+    UNITS, PointError, apply_matrix_transform, node_format, number_size,
+    preserved_ratio, size, transform)
 from .image import image
 from .parser import Tree
 from .path import draw_markers, path
+from .properties import has_children
 from .shapes import circle, ellipse, line, polygon, polyline, rect
+from .stream import StreamError, StreamTree
 from .svg import svg
 from .text import text
-from .url import parse_url
 
 SHAPE_ANTIALIAS = {
     'optimizeSpeed': cairo.ANTIALIAS_FAST,
@@ -107,11 +107,15 @@ class Surface(object):
     # Subclasses must either define this or override _create_surface()
     surface_class = None
 
+    # Tolerance used with the 'auto' tolerance policy, in device units. Cairo
+    # doesn't use tolerances smaller than its 24.8 fixed-point precision.
+    auto_tolerance = 1 / 256
+
     @classmethod
     def convert(cls, bytestring=None, *, file_obj=None, url=None, dpi=96,
                 parent_width=None, parent_height=None, scale=1, unsafe=False,
                 write_to=None, output_width=None, output_height=None,
-                **kwargs):
+                tolerance=None, simplify=None, streaming=False, **kwargs):
         """Convert a SVG document to the format for this class.
 
         Specify the input by passing one of these:
@@ -128,6 +132,22 @@ class Surface(object):
         :param scale: The ouptut scaling factor.
         :param unsafe: A boolean allowing XML entities and very large files
                        (WARNING: vulnerable to XXE attacks and various DoS).
+        :param tolerance: The maximum error when curves are approximated, in
+                          device units (pixels for PNG, points otherwise), or
+                          ``'auto'`` to use a value suited to the output
+                          format. If None, arcs are drawn with a very small
+                          tolerance, as in previous versions: ``'auto'``
+                          draws faster but changes the rendering of arcs.
+        :param simplify: The maximum distance between simplified and original
+                         lines of paths, polylines and polygons, in device
+                         units. If None, lines are not simplified.
+        :param streaming: A boolean drawing the elements while the document
+                          is parsed, to save memory with large documents.
+                          Documents needing lookahead, such as documents
+                          with forward references, are drawn again without
+                          streaming.
+        :param stylesheets: A list of :class:`css.Stylesheet` objects, applied
+                            after the stylesheets of the document.
 
         Specifiy the output with:
 
@@ -138,20 +158,73 @@ class Surface(object):
         parameters are keyword-only.
 
         """
+        arguments = dict(
+            dpi=dpi, parent_width=parent_width, parent_height=parent_height,
+            scale=scale, unsafe=unsafe, write_to=write_to,
+            output_width=output_width, output_height=output_height,
+            tolerance=tolerance, simplify=simplify, **kwargs)
+        if streaming:
+            return cls._convert_streaming(
+                bytestring, file_obj, url, arguments)
+
         tree = Tree(
             bytestring=bytestring, file_obj=file_obj, url=url, unsafe=unsafe,
             **kwargs)
         output = write_to or io.BytesIO()
         instance = cls(
             tree, output, dpi, None, parent_width, parent_height, scale,
-            output_width, output_height)
+            output_width, output_height, tolerance, simplify)
         instance.finish()
         if write_to is None:
             return output.getvalue()
 
+    @classmethod
+    def _convert_streaming(cls, bytestring, file_obj, url, arguments):
+        """Convert a SVG document drawn while it is parsed.
+
+        The output is buffered, as the document is drawn again without
+        streaming if it needs lookahead.
+
+        """
+        position = None
+        if file_obj is not None:
+            if getattr(file_obj, 'seekable', lambda: False)():
+                position = file_obj.tell()
+            else:
+                bytestring, file_obj = file_obj.read(), None
+
+        write_to = arguments.pop('write_to')
+        output = io.BytesIO()
+        try:
+            tree = StreamTree(
+                bytestring=bytestring, file_obj=file_obj, url=url,
+                **arguments)
+            instance = cls(
+                tree, output, arguments['dpi'], None,
+                arguments['parent_width'], arguments['parent_height'],
+                arguments['scale'], arguments['output_width'],
+                arguments['output_height'], arguments['tolerance'],
+                arguments['simplify'])
+            instance.finish()
+        except StreamError:
+            if position is not None:
+                file_obj.seek(position)
+            return cls.convert(
+                bytestring, file_obj=file_obj, url=url, write_to=write_to,
+                **arguments)
+
+        if write_to is None:
+            return output.getvalue()
+        elif hasattr(write_to, 'write'):
+            write_to.write(output.getvalue())
+        else:
+            with open(write_to, 'wb') as file_object:
+                file_object.write(output.getvalue())
+
     def __init__(self, tree, output, dpi, parent_surface=None,
                  parent_width=None, parent_height=None,
-                 scale=1, output_width=None, output_height=None):
+                 scale=1, output_width=None, output_height=None,
+                 tolerance=None, simplify=None):
         """Create the surface from a filename or a file-like object.
 
         The rendered content is written to ``output`` which can be a filename,
@@ -161,6 +234,9 @@ class Surface(object):
         Call the ``.finish()`` method to make sure that the output is
         actually written.
 
+        ``tolerance`` and ``simplify`` are described in ``convert``. Surfaces
+        with a ``parent_surface`` use the values of their parent.
+
         """
         self.cairo = None
         self.context_width, self.context_height = parent_width, parent_height
@@ -175,6 +251,9 @@ class Surface(object):
             self.masks = parent_surface.masks
             self.paths = parent_surface.paths
             self.filters = parent_surface.filters
+            self.resolved_defs = parent_surface.resolved_defs
+            self.tolerance = parent_surface.tolerance
+            self.simplify = parent_surface.simplify
         else:
             self.markers = {}
             self.gradients = {}
@@ -182,6 +261,10 @@ class Surface(object):
             self.masks = {}
             self.paths = {}
             self.filters = {}
+            self.resolved_defs = {}
+            self.tolerance = (
+                self.auto_tolerance if tolerance == 'auto' else tolerance)
+            self.simplify = simplify
         self._old_parent_node = self.parent_node = None
         self.output = output
         self.dpi = dpi
@@ -206,6 +289,8 @@ class Surface(object):
             width * self.device_units_per_user_units,
             height * self.device_units_per_user_units)
         self.context = cairo.Context(self.cairo)
+        if self.tolerance is not None:
+            self.context.set_tolerance(self.tolerance)
         # We must scale the context as the surface size is using physical units
         self.context.scale(
             self.device_units_per_user_units, self.device_units_per_user_units)
@@ -270,10 +355,27 @@ class Surface(object):
         self.cairo.finish()
 
     def draw(self, node):
-        """Draw ``node`` and its children."""
+        """Draw ``node`` and its children.
 
-        # Parse definitions first
-        if node.tag == 'svg':
+        Children are drawn with an explicit stack of ``draw_node`` generators
+        instead of recursion, so that deeply nested documents can be drawn.
+
+        """
+        stack = [self.draw_node(node)]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+            else:
+                stack.append(self.draw_node(child))
+
+    def draw_node(self, node):
+        """Draw ``node``, yield its children to draw them, see ``draw``."""
+
+        # Parse definitions first, streamed trees parse them while drawing
+        if isinstance(node, StreamTree):
+            node.surface = self
+        elif node.tag == 'svg':
             parse_all_defs(self, node)
 
         # Do not draw defs
@@ -290,21 +392,21 @@ class Surface(object):
         old_font_size = self.font_size
         old_context_size = self.context_width, self.context_height
         self.parent_node = node
-        self.font_size = size(self, node.get('font-size', '12pt'))
+        self.font_size = number_size(self, *node.value('font-size'))
         self.context.save()
 
         # Apply transformations
         transform(self, node.get('transform'))
 
         # Find and prepare opacity, masks and filters
-        mask = parse_url(node.get('mask')).fragment
-        filter_ = parse_url(node.get('filter')).fragment
-        opacity = float(node.get('opacity', 1))
+        mask = node.value('mask')
+        filter_ = node.value('filter')
+        opacity = node.value('opacity')
 
         if filter_:
             prepare_filter(self, node, filter_)
 
-        if filter_ or mask or (opacity < 1 and node.children):
+        if filter_ or mask or (opacity < 1 and has_children(node)):
             self.context.push_group()
 
         # Move to (node.x, node.y)
@@ -325,23 +427,22 @@ class Surface(object):
         if join_cap == 'bevel':
             self.context.set_line_join(cairo.LINE_JOIN_BEVEL)
 
-        dash_array = normalize(node.get('stroke-dasharray', '')).split()
-        if dash_array:
-            dashes = [size(self, dash) for dash in dash_array]
-            if sum(dashes):
-                offset = size(self, node.get('stroke-dashoffset'))
-                self.context.set_dash(dashes, offset)
+        dashes = [
+            number_size(self, *token)
+            for token in node.value('stroke-dasharray')]
+        if sum(dashes):
+            offset = number_size(self, *node.value('stroke-dashoffset'))
+            self.context.set_dash(dashes, offset)
 
-        miter_limit = float(node.get('stroke-miterlimit', 4))
-        self.context.set_miter_limit(miter_limit)
+        self.context.set_miter_limit(node.value('stroke-miterlimit'))
 
         # Clip
-        rect_values = clip_rect(node.get('clip'))
+        rect_values = node.value('clip')
         if len(rect_values) == 4:
-            top = size(self, rect_values[0], 'y')
-            right = size(self, rect_values[1], 'x')
-            bottom = size(self, rect_values[2], 'y')
-            left = size(self, rect_values[3], 'x')
+            top, right, bottom, left = (
+                number_size(self, number, unit, reference)
+                for (number, unit), reference
+                in zip(rect_values, ('y', 'x', 'y', 'x')))
             x = size(self, node.get('x'), 'x')
             y = size(self, node.get('y'), 'y')
             width = size(self, node.get('width'), 'x')
@@ -352,7 +453,7 @@ class Surface(object):
                 left, top, width - left - right, height - top - bottom)
             self.context.restore()
             self.context.clip()
-        clip_path = parse_url(node.get('clip-path')).fragment
+        clip_path = node.value('clip-path')
         if clip_path:
             path = self.paths.get(clip_path)
             if path:
@@ -383,13 +484,6 @@ class Surface(object):
                 # Error in point parsing, do nothing
                 pass
 
-        # Get stroke and fill opacity
-        stroke_opacity = float(node.get('stroke-opacity', 1))
-        fill_opacity = float(node.get('fill-opacity', 1))
-        if opacity < 1 and not node.children:
-            stroke_opacity *= opacity
-            fill_opacity *= opacity
-
         # Manage display and visibility
         display = node.get('display', 'inline') != 'none'
         visible = display and (node.get('visibility', 'visible') != 'hidden')
@@ -411,22 +505,21 @@ class Surface(object):
         if self.stroke_and_fill and visible and node.tag in TAGS:
             # Fill
             self.context.save()
-            paint_source, paint_color = paint(node.get('fill', 'black'))
+            paint_source, _ = node.value('fill')
             if not gradient_or_pattern(self, node, paint_source):
                 if node.get('fill-rule') == 'evenodd':
                     self.context.set_fill_rule(cairo.FILL_RULE_EVEN_ODD)
-                self.context.set_source_rgba(*color(paint_color, fill_opacity))
+                self.context.set_source_rgba(*node.value('fill-color'))
             self.context.fill_preserve()
             self.context.restore()
 
             # Stroke
             self.context.save()
             self.context.set_line_width(
-                size(self, node.get('stroke-width', '1')))
-            paint_source, paint_color = paint(node.get('stroke'))
+                number_size(self, *node.value('stroke-width')))
+            paint_source, _ = node.value('stroke')
             if not gradient_or_pattern(self, node, paint_source):
-                self.context.set_source_rgba(
-                    *color(paint_color, stroke_opacity))
+                self.context.set_source_rgba(*node.value('stroke-color'))
             self.context.stroke()
             self.context.restore()
         elif not visible:
@@ -437,11 +530,10 @@ class Surface(object):
 
         # Draw children
         if display and node.tag not in INVISIBLE_TAGS:
-            for child in node.children:
-                self.draw(child)
+            yield from node.children
 
         # Apply filter, mask and opacity
-        if filter_ or mask or (opacity < 1 and node.children):
+        if filter_ or mask or (opacity < 1 and has_children(node)):
             self.context.pop_group_to_source()
             if filter_:
                 apply_filter_before_painting(self, node, filter_)
@@ -477,6 +569,7 @@ class PSSurface(Surface):
 class PNGSurface(Surface):
     """A surface that writes in PNG format."""
     device_units_per_user_units = 1
+    auto_tolerance = 0.1
 
     def _create_surface(self, width, height):
         """Create and return ``(cairo_surface, width, height)``."""
@@ -21,16 +21,22 @@ These tests can be used as deployment tests.
 
 """
 
+import gzip
 import io
 import os
 import shutil
 import sys
 import tempfile
+import threading
 
 import cairocffi as cairo
+import cssselect2
 import pytest
+from defusedxml import EntitiesForbidden
 
-from . import SURFACES, VERSION, parser, surface, svg2pdf, svg2png
+from . import (
+    SURFACES, VERSION, bounding_box, css, parser, properties, stream, surface,
+    svg2pdf, svg2png)
 from .__main__ import main
 
 MAGIC_NUMBERS = {
@@ -56,6 +62,12 @@ def test_formats(format_name):
     assert content.startswith(MAGIC_NUMBERS[format_name])
 
 
+class ReadOnlyFile(object):
+    """File-like object only giving a ``read`` method."""
+    def __init__(self, bytestring):
+        self.read = io.BytesIO(bytestring).read
+
+
 def read_file(filename):
     """Shortcut to return the whole content of a file as a byte string."""
     with open(filename, 'rb') as file_object:
@@ -96,6 +108,31 @@ def test_api():
             # Read from a real file object
             assert svg2png(file_obj=file_object) == expected_content
 
+        temp_gz = os.path.join(temp, 'sample_0.svgz')
+        with open(temp_gz, 'wb') as file_object:
+            file_object.write(gzip.compress(SVG_SAMPLE))
+
+        # Read from a gzipped file
+        assert svg2png(url=temp_gz) == expected_content
+        with open(temp_gz, 'rb') as file_object:
+            assert svg2png(file_obj=file_object) == expected_content
+        assert svg2png(gzip.compress(SVG_SAMPLE)) == expected_content
+
+        # Read from sources that can't seek
+        for bytestring in (SVG_SAMPLE, gzip.compress(SVG_SAMPLE)):
+            for streaming in (False, True):
+                read_fd, write_fd = os.pipe()
+                os.write(write_fd, bytestring)
+                os.close(write_fd)
+                with open(read_fd, 'rb', buffering=0) as file_object:
+                    assert svg2png(
+                        file_obj=file_object, streaming=streaming) == (
+                            expected_content)
+                file_object = ReadOnlyFile(bytestring)
+                assert svg2png(
+                    file_obj=file_object, streaming=streaming) == (
+                        expected_content)
+
         temp_1 = os.path.join(temp, 'result_1.png')
         with open(temp_1, 'wb') as file_object:
             # Write to a real file object
@@ -142,6 +179,436 @@ def test_low_level_api():
     assert cairo.SurfacePattern(png_surface.cairo)
 
 
+def test_inheritance():
+    """Test the inheritance of node attributes."""
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg" fill="red" color="blue">
+        <g stroke="currentColor" width="10">
+          <rect fill="inherit" stroke="green"/>
+          <rect style="fill: none" stroke="inherit"/>
+        </g>
+      </svg>''')
+    group, = tree.children
+    first, second = group.children
+    assert dict.get(group, 'fill') is None
+    assert group['fill'] == 'red'
+    assert group['stroke'] == 'blue'
+    assert 'width' not in first and first.get('width', 0) == 0
+    assert (first['fill'], first['stroke']) == ('red', 'green')
+    assert (second['fill'], second['stroke']) == ('none', 'blue')
+    assert dict(second.items())['color'] == 'blue'
+    assert set(second) >= {'fill', 'stroke', 'color'}
+
+    # Equal declarations are shared
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg">
+        <style>rect { stroke: blue }</style>
+        <rect x="1" fill="red"/><rect x="2" fill="red"/>
+      </svg>''')
+    _, first, second = tree.children
+    assert first.declarations is second.declarations
+    assert (first['x'], second['x']) == ('1', '2')
+
+
+def test_references():
+    """Test the references to elements of the same document."""
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg">
+        <rect id="a" fill="red"/>
+        <g><rect id="b" fill="blue"/></g>
+        <rect id="a" fill="green"/>
+      </svg>''')
+    first, group, last = tree.children
+    assert parser.Tree(url='#b', parent=first)['fill'] == 'blue'
+    assert parser.Tree(url='#a', parent=last)['fill'] == 'red'
+    assert parser.Tree(url='#b', parent=group.children[0]).tag == 'rect'
+    with pytest.raises(TypeError):
+        parser.Tree(url='#c', parent=first)
+
+
+def test_plain_elements():
+    """Test the elements of documents without stylesheets."""
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg">
+        <style>rect { }</style>
+        <rect id="a" fill="red" style="fill: blue"/>
+        <text>a<tspan>b</tspan>c</text>
+      </svg>''')
+    assert tree.style is None
+    assert isinstance(tree.element, parser.PlainElement)
+    _, rect, text = tree.children
+    assert rect['fill'] == 'blue'
+    assert [child.text for child in text.children] == ['b', 'c']
+    assert parser.Tree(url='#a', parent=text).tag == 'rect'
+
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg">
+        <style>rect { fill: green }</style>
+        <rect/>
+      </svg>''')
+    assert tree.style is not None
+    assert tree.children[-1]['fill'] == 'green'
+
+
+def test_stylesheet_cache():
+    """Test the stylesheets shared by documents."""
+    svg = b'''
+      <svg xmlns="http://www.w3.org/2000/svg">
+        <style>rect { fill: green }</style>
+        <rect/>
+      </svg>'''
+    css.STYLESHEET_CACHE.clear()
+    tree = parser.Tree(bytestring=svg)
+    assert parser.Tree(bytestring=svg).style is tree.style
+    assert css.STYLESHEET_CACHE.info()[:2] == (1, 1)
+    parser.Tree(bytestring=svg, url='http://example.com/')
+    assert css.STYLESHEET_CACHE.info()[:2] == (1, 2)
+
+
+def test_style_cache():
+    """Test the style attributes parsed once."""
+    css.STYLE_CACHE.clear()
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg">
+        <rect style="fill: url(#A) Red; stroke: blue !important"/>
+        <rect style="fill: url(#A) Red; stroke: blue !important"/>
+      </svg>''')
+    rects = tree.children
+    assert css.STYLE_CACHE.info()[:2] == (1, 1)
+    for rect in rects:
+        assert rect['fill'] == 'url(#A) Red'
+        assert rect.value('fill') == ('A', 'Red')
+        assert rect.value('fill-color') == (1, 0, 0, 1)
+        assert rect['stroke'] == 'blue'
+
+
+def test_stylesheets():
+    """Test the stylesheets applied to converted documents."""
+    stylesheet = css.Stylesheet(
+        'rect { fill: green; stroke: green } .a { opacity: .5 }')
+    svg = b'''
+      <svg xmlns="http://www.w3.org/2000/svg" width="10" height="10">
+        <style>rect { fill: red !important; stroke: red; opacity: 1 }</style>
+        <rect class="a" style="stroke-width: 2" width="5" height="5"/>
+        <rect style="stroke: blue" x="5" width="5" height="5"/>
+      </svg>'''
+    tree = parser.Tree(bytestring=svg, stylesheets=[stylesheet])
+    _, first, second = tree.children
+    assert (first['fill'], first['stroke'], first['opacity']) == (
+        'red', 'green', '.5')
+    assert (second['stroke'], second['opacity']) == ('blue', '1')
+    tree = parser.Tree(bytestring=SVG_SAMPLE, stylesheets=[stylesheet])
+    assert parser.Tree(
+        bytestring=SVG_SAMPLE, stylesheets=[stylesheet]).style is tree.style
+
+    tree = stream.StreamTree(bytestring=svg, stylesheets=[stylesheet])
+    assert [child.get('stroke') for child in tree.children] == [
+        None, 'green', 'blue']
+    with pytest.raises(stream.StreamError):
+        stream.StreamTree(
+            bytestring=svg, stylesheets=[css.Stylesheet(':empty {}')])
+    assert svg2png(svg, stylesheets=[stylesheet], streaming=True) == (
+        svg2png(svg, stylesheets=[stylesheet]))
+
+    with pytest.raises(TypeError):
+        css.Stylesheet()
+
+
+def test_matcher():
+    """Test the selectors indexed by ``css.Matcher``."""
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg">
+        <style>
+          rect { fill: red }
+          #a rect, g > .b { fill: green }
+          .c rect, rect + rect, :not(.b) { stroke: blue }
+          G rect, text rect { stroke: red }
+        </style>
+        <g id="a" class="c"><rect/><rect class="b"/></g>
+        <rect/>
+      </svg>''')
+    _, group, rect = tree.children
+    first, second = group.children
+    assert (first['fill'], first['stroke']) == ('green', 'blue')
+    assert (second['fill'], second['stroke']) == ('green', 'blue')
+    assert (rect['fill'], rect['stroke']) == ('red', 'blue')
+    assert group['stroke'] == 'blue'
+
+    # Deeply nested elements match the selectors matched by cssselect2
+    depth = 2000
+    bytestring = (
+        '<svg xmlns="http://www.w3.org/2000/svg">' + ''.join(
+            '<g id="g{}" class="c{}">'.format(i, i % 7)
+            for i in range(depth)) +
+        '<rect class="r"/>' + '</g>' * depth + '</svg>').encode('ascii')
+    stylesheet = css.Stylesheet('''
+      rect, g { fill: red }
+      #g10 rect, .c3 > g, #g1999 > .r, g.c5 g.c6 { fill: green }
+      .c1 .c2 .c4 g, #g1500 ~ g, svg > g, #missing g { stroke: blue }
+      g.c2 rect, .c0 g > g.c1, :not(.c3) > .c4 { stroke: red }
+    ''')
+    matcher = css.Matcher()
+    reference_matcher = cssselect2.Matcher()
+    for index, (selector, compiled_selector, _, _) in enumerate(
+            stylesheet.rules):
+        matcher.add_selector(selector, compiled_selector, index)
+        reference_matcher.add_selector(compiled_selector, index)
+    root = cssselect2.ElementWrapper.from_xml_root(
+        parser.parse_defusedxml(io.BytesIO(bytestring), False))
+    for element in root.iter_subtree():
+        assert [rule[-1] for rule in matcher.match(element)] == [
+            rule[-1] for rule in reference_matcher.match(element)]
+
+
+def test_definitions():
+    """Test the elements including definitions found while parsing."""
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg">
+        <g><linearGradient id="a"/><rect/></g>
+        <rect/>
+        <path id="b"/>
+      </svg>''')
+    group, rect, path = tree.children
+    gradient, _ = group.children
+    assert tree.document.definitions == {
+        tree.xml_tree, group.xml_tree, gradient.xml_tree, path.xml_tree}
+    reference = parser.Tree(url='#a', parent=rect)
+    assert reference.document.definitions is tree.document.definitions
+
+
+def test_resolved_definitions():
+    """Test the gradients and patterns resolved with their href chains."""
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg"
+           xmlns:xlink="http://www.w3.org/1999/xlink">
+        <linearGradient id="a"><stop/><stop offset="1"/></linearGradient>
+        <linearGradient id="b" xlink:href="#a" x2="0"/>
+        <pattern id="c" width=".5" height=".5"><rect/></pattern>
+        <pattern id="d" xlink:href="#c"/>
+        <rect width="1" height="1" fill="url(#b)" stroke="url(#d)"/>
+        <rect width="2" height="2" fill="url(#b)" stroke="url(#d)"/>
+      </svg>''')
+    png = surface.PNGSurface(tree, None, 96)
+    gradient = png.gradients['b']
+    assert gradient['x2'] == '0'
+    assert len(gradient.children) == 2
+    assert png.resolved_defs[id(png.gradients), 'b'] is gradient
+    pattern = png.patterns['d']
+    assert pattern.tag == 'pattern'
+    assert pattern['width'] == '.5'
+    assert len(pattern.children) == 1
+
+    # Patterns are drawn from copies only including their own attributes
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg"
+           xmlns:xlink="http://www.w3.org/1999/xlink" width="10" height="10">
+        <svg x="1" width="8" height="8" fill="blue">
+          <pattern id="a" x="2" width="4" height="4"
+                   patternUnits="userSpaceOnUse"><rect/></pattern>
+        </svg>
+        <pattern id="b" xlink:href="#a" height="2"/>
+        <rect width="10" height="10" fill="url(#b)"/>
+      </svg>''')
+    png = surface.PNGSurface(tree, None, 96)
+    pattern = png.patterns['b']
+    generation = tree.document.root.generation
+    pattern_copy = pattern.copy()
+    assert tree.document.root.generation == generation
+    assert dict(dict.items(pattern_copy)) == dict(dict.items(pattern))
+    assert 'fill' not in dict(dict.items(pattern_copy))
+    assert (pattern_copy['x'], pattern_copy['width']) == ('2', '4')
+    assert (pattern_copy['height'], pattern_copy['fill']) == ('2', 'blue')
+    pattern_copy.tag = 'g'
+    pattern_copy.value('opacity')
+    assert pattern._values is None or 'opacity' not in pattern._values
+
+
+def test_values():
+    """Test the typed values of node properties."""
+    tree = parser.Tree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg" opacity=".5">
+        <rect fill="url(#a) blue" stroke-dasharray="1, 2em" mask="url(#m)"/>
+      </svg>''')
+    rect, = tree.children
+    assert rect.value('fill') == ('a', 'blue')
+    assert rect.value('fill-color') == (0, 0, 1, 1)
+    assert rect.value('stroke-dasharray') == [(1, ''), (2, 'em')]
+    assert rect.value('mask') == 'm'
+    assert rect.value('font-size') == (12, 'pt')
+    assert tree.value('opacity') == .5
+    rect['fill-opacity'] = '.5'
+    assert rect.value('fill-color') == (0, 0, 1, .5)
+
+
+@pytest.mark.parametrize('xml_parser', parser.XML_PARSERS)
+def test_xml_parsers(xml_parser):
+    """Test the XML parsers."""
+    tree = parser.Tree(bytestring=SVG_SAMPLE, xml_parser=xml_parser)
+    rect, = tree.children
+    assert (rect.tag, rect['fill'], rect['width']) == ('rect', 'lime', '13')
+
+    bytestring = b'''<!DOCTYPE svg [<!ENTITY width "13">]>
+      <svg xmlns="http://www.w3.org/2000/svg">
+        <!-- Comment --><rect width="&width;"/><?instruction?>
+      </svg>'''
+    with pytest.raises(EntitiesForbidden):
+        parser.Tree(bytestring=bytestring, xml_parser=xml_parser)
+    tree = parser.Tree(
+        bytestring=bytestring, xml_parser=xml_parser, unsafe=True)
+    rect, = tree.children
+    assert rect['width'] == '13'
+
+
+@pytest.mark.parametrize('xml_parser', (None,) + tuple(parser.XML_PARSERS))
+def test_deep_nesting(xml_parser):
+    """Test documents with deeply nested elements."""
+    depth = 50000
+    bytestring = (
+        b'<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10">' +
+        b'<g fill="lime">' * depth + b'<rect width="5" height="5"/>' +
+        b'</g>' * depth +
+        b'<text>a' + b'<tspan>b' * depth + b'</tspan>' * depth + b'</text>' +
+        b'</svg>')
+    # libxml2 limits the depth of documents, lxml falls back to defusedxml
+    tree = parser.Tree(bytestring=bytestring, xml_parser=xml_parser)
+    png_surface = surface.PNGSurface(tree, None, 96)
+    group, text = tree.children
+    assert bounding_box.calculate_bounding_box(png_surface, group) == (
+        0, 0, 5, 5)
+
+
+def test_concurrent_documents():
+    """Test documents modified while other documents are drawn."""
+    bytestring = (
+        b'<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10" '
+        b'fill="lime">' + b'<g>' * 100 + b'<rect width="5" height="5"/>' +
+        b'</g>' * 100 + b'</svg>')
+    expected_content = svg2png(bytestring)
+    drawn_tree = parser.Tree(bytestring=bytestring)
+    modified_tree = parser.Tree(bytestring=bytestring)
+
+    # Values inherited in a document are kept when other documents change
+    node = drawn_tree
+    while node.children:
+        node, = node.children
+    assert node['fill'] == 'lime'
+    generation = drawn_tree.document.generation
+    modified_tree['fill'] = 'red'
+    assert drawn_tree.document.generation == generation
+    assert node['fill'] == 'lime'
+
+    results = []
+
+    def draw():
+        for _ in range(20):
+            file_like = io.BytesIO()
+            surface.PNGSurface(drawn_tree, file_like, 96).finish()
+            results.append(file_like.getvalue())
+
+    thread = threading.Thread(target=draw)
+    thread.start()
+    while thread.is_alive():
+        for color in ('red', 'blue'):
+            modified_tree['fill'] = color
+            node = modified_tree
+            while node.children:
+                node, = node.children
+            assert node['fill'] == color
+    thread.join()
+    assert results == 20 * [expected_content]
+
+
+def test_tolerance():
+    """Test the tolerance option."""
+    tree = parser.Tree(bytestring=SVG_SAMPLE)
+    png_surface = surface.PNGSurface(tree, None, 96, tolerance='auto')
+    assert png_surface.context.get_tolerance() == 0.1
+    pdf_surface = surface.PDFSurface(tree, None, 96, tolerance='auto')
+    assert pdf_surface.context.get_tolerance() == 1 / 256
+    png_surface = surface.PNGSurface(tree, None, 96, tolerance=0.5)
+    assert png_surface.context.get_tolerance() == 0.5
+
+    # No curves in the sample
+    assert svg2png(SVG_SAMPLE, tolerance='auto') == svg2png(SVG_SAMPLE)
+
+
+def test_streaming():
+    """Test the streaming renderer and its fallback."""
+    assert svg2png(SVG_SAMPLE, streaming=True) == svg2png(SVG_SAMPLE)
+    assert svg2png(
+        file_obj=io.BytesIO(SVG_SAMPLE), streaming=True) == svg2png(SVG_SAMPLE)
+
+    tree = stream.StreamTree(bytestring=b'''
+      <svg xmlns="http://www.w3.org/2000/svg">
+        <title>Streamed</title>
+        <style>rect { fill: red }</style>
+        <g><rect/><circle/></g>
+        <path/>
+      </svg>''')
+    title, style, group = (next(tree.children) for _ in range(3))
+    assert (title.tag, style.tag, group.tag) == ('title', 'style', 'g')
+    rect, circle = group.children
+    assert rect['fill'] == 'red'
+    path, = tree.children
+    assert path.tag == 'path'
+    # Drawn elements are released
+    assert len(tree.xml_tree) == 2
+
+    # Sources opened by streamed trees are closed once parsed
+    temp = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(temp, 'sample.svg')
+        for bytestring in (SVG_SAMPLE, b'''
+              <svg xmlns="http://www.w3.org/2000/svg">
+                <rect fill="url(#a)"/><linearGradient id="a"/>
+              </svg>'''):
+            with open(filename, 'wb') as file_object:
+                file_object.write(bytestring)
+            tree = stream.StreamTree(url=filename)
+            source = tree._opened
+            try:
+                for child in tree.children:
+                    pass
+            except stream.StreamError:
+                pass
+            assert source.closed
+    finally:
+        shutil.rmtree(temp)
+
+    # Documents needing lookahead are drawn without streaming
+    for svg in (
+            b'<rect fill="url(#a)"/><linearGradient id="a"/>',
+            b'<rect/><style>rect { fill: red }</style>',
+            b'<style>rect:last-child { fill: red }</style><rect/>',
+            b'<style>rect:first-of-type { fill: red }</style>'
+            b'<circle/><rect/><rect/>',
+            b'<style>rect:nth-of-type(2) { stroke: blue }</style>'
+            b'<rect/><circle/><rect/>',
+            b'<style>:nth-child(2 of rect) { fill: red }</style>'
+            b'<rect/><circle/><rect/>'):
+        bytestring = (
+            b'<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10">'
+            + svg + b'</svg>')
+        with pytest.raises(stream.StreamError):
+            for child in stream.StreamTree(bytestring=bytestring).children:
+                pass
+        assert svg2png(bytestring, streaming=True) == svg2png(bytestring)
+
+    # Empty groups are containers, whether their children are streamed or not
+    bytestring = (
+        b'<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10">'
+        b'<g opacity=".5"/><g opacity=".5"><rect width="5" height="5"/></g>'
+        b'<rect opacity=".5" width="10" height="5" stroke="red"/></svg>')
+    for tree in (
+            parser.Tree(bytestring=bytestring),
+            stream.StreamTree(bytestring=bytestring)):
+        empty_group, group, rect = tree.children
+        assert properties.has_children(empty_group)
+        assert properties.has_children(group)
+        assert not properties.has_children(rect)
+    assert svg2png(bytestring, streaming=True) == svg2png(bytestring)
+
+
 def test_script():
     """Test the ``cairosvg`` script and the ``main`` function."""
     expected_png = svg2png(SVG_SAMPLE)
@@ -196,6 +663,11 @@ def test_script():
             expected_pdf)
         assert test_main([svg_filename, '-f', 'png']) == expected_png
         assert test_main(['-'], input_=svg_filename) == expected_pdf
+        assert test_main(
+            [svg_filename, '-f', 'png', '--tolerance', 'auto']) == expected_png
+        assert test_main(
+            [svg_filename, '-f', 'png', '--simplify', '0.5']) == expected_png
+        assert test_main([svg_filename, '--streaming']) == expected_pdf
 
         # Test DPI
         output = test_main([svg_filename, '-d', '10', '-f', 'png'])
@@ -220,6 +692,13 @@ def test_script():
             # Explicit -f wins
             assert not test_main([svg_filename, '-o', temp_3, '-f', 'pdf'])
             assert read_file(temp_3) == expected_pdf
+
+            stylesheet = os.path.join(temp, 'stylesheet.css')
+            with open(stylesheet, 'wb') as css_file:
+                css_file.write(b'svg { }')
+            assert test_main([
+                svg_filename, '--stylesheet', stylesheet,
+                '--stylesheet', stylesheet]) == expected_pdf
         finally:
             shutil.rmtree(temp)
 
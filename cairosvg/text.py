@@ -23,7 +23,8 @@ from math import cos, radians, sin
 
 from .bounding_box import (
     EMPTY_BOUNDING_BOX, extend_bounding_box, is_valid_bounding_box)
-from .helpers import distance, normalize, point_angle, size, zip_letters
+from .helpers import (
+    distance, number_size, numbers, point_angle, size, zip_letters)
 from .surface import cairo
 from .url import parse_url
 
@@ -93,20 +94,20 @@ def text(surface, node):
 
     x, y, dx, dy, rotate = [], [], [], [], [0]
     if 'x' in node:
-        x = [size(surface, i, 'x')
-             for i in normalize(node['x']).strip().split(' ')]
+        x = [number_size(surface, number, unit, 'x')
+             for number, unit in numbers(node['x'])]
     if 'y' in node:
-        y = [size(surface, i, 'y')
-             for i in normalize(node['y']).strip().split(' ')]
+        y = [number_size(surface, number, unit, 'y')
+             for number, unit in numbers(node['y'])]
     if 'dx' in node:
-        dx = [size(surface, i, 'x')
-              for i in normalize(node['dx']).strip().split(' ')]
+        dx = [number_size(surface, number, unit, 'x')
+              for number, unit in numbers(node['dx'])]
     if 'dy' in node:
-        dy = [size(surface, i, 'y')
-              for i in normalize(node['dy']).strip().split(' ')]
+        dy = [number_size(surface, number, unit, 'y')
+              for number, unit in numbers(node['dy'])]
     if 'rotate' in node:
-        rotate = [radians(float(i)) if i else 0
-                  for i in normalize(node['rotate']).strip().split(' ')]
+        rotate = [radians(number) for number, unit in numbers(
+            node['rotate'])] or [0]
     last_r = rotate[-1]
     letters_positions = zip_letters(x, y, dx, dy, rotate, node.text)
 
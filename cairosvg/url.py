@@ -19,11 +19,13 @@ Utils dealing with URLs.
 
 """
 
+import io
+import mmap
 import os.path
 import re
 from pathlib import Path
 from urllib.parse import urljoin, urlparse
-from urllib.request import Request, urlopen
+from urllib.request import Request, url2pathname, urlopen
 
 from . import VERSION
 
@@ -139,15 +141,38 @@ def parse_url(url, base=None):
     return urlparse(url or '')
 
 
+def absolute_url(url):
+    """Get the absolute URL string of a parsed ``url``."""
+    if url.scheme:
+        return url.geturl()
+    url = 'file://{}'.format(os.path.abspath(url.geturl()))
+    return normalize_url(url)
+
+
 def read_url(url, url_fetcher, resource_type):
     """Get bytes in a parsed ``url`` using ``url_fetcher``.
 
     If ``url_fetcher`` is None a default (no limitations) URLFetcher is used.
     """
-    if url.scheme:
-        url = url.geturl()
-    else:
-        url = 'file://{}'.format(os.path.abspath(url.geturl()))
-        url = normalize_url(url)
+    return url_fetcher(absolute_url(url), resource_type)
 
-    return url_fetcher(url, resource_type)
+
+def open_url(url, url_fetcher, resource_type):
+    """Get a file-like object reading a parsed ``url`` using ``url_fetcher``.
+
+    Local files fetched by the default fetcher are memory-mapped instead of
+    being read in memory.
+
+    """
+    url = absolute_url(url)
+    parsed_url = urlparse(url)
+    if url_fetcher is fetch and parsed_url.scheme == 'file':
+        path = url2pathname(nt_compatible_path(parsed_url.path))
+        try:
+            with open(path, 'rb') as file_object:
+                return mmap.mmap(
+                    file_object.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files and special files can't be mapped
+            pass
+    return io.BytesIO(url_fetcher(url, resource_type))
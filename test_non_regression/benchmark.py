@@ -0,0 +1,294 @@
+# This file is part of CairoSVG
+# Copyright © 2010-2018 Kozea
+#
+# This library is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with CairoSVG.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+CairoSVG benchmarks.
+
+Run a benchmark from the root of the repository with::
+
+    PYTHONPATH=. python test_non_regression/benchmark.py <name>
+
+Set ``PYTHONPATH`` to another checkout to get the numbers of another version.
+Available benchmarks are the functions of ``BENCHMARKS``.
+
+"""
+
+import os
+import sys
+import time
+from collections import Counter
+
+import cairocffi
+import cairosvg
+
+SVG_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'svg')
+
+# Cairo functions building paths
+PATH_FUNCTIONS = {
+    'cairo_{}'.format(name) for name in (
+        'move_to', 'line_to', 'curve_to', 'rel_move_to', 'rel_line_to',
+        'rel_curve_to', 'close_path', 'arc', 'arc_negative', 'rectangle',
+        'append_path')}
+
+
+class CallCounter(object):
+    """Proxy of the cffi library of Cairo counting the calls of functions."""
+    def __init__(self, library):
+        self.library = library
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        function = getattr(self.library, name)
+        if not callable(function):
+            return function
+
+        def counted(*args):
+            self.calls[name] += 1
+            return function(*args)
+        return counted
+
+
+def render_corpus(**kwargs):
+    """Render the files of ``SVG_FOLDER`` to PNG, as non-regression tests.
+
+    Return the list of rendered pixels.
+
+    """
+    cairosvg.features.LOCALE = 'en_US'
+    os.chdir(SVG_FOLDER)  # relative image urls
+    pixels = []
+    for name in sorted(os.listdir(SVG_FOLDER), key=str.lower):
+        tree = cairosvg.parser.Tree(
+            url=os.path.join(SVG_FOLDER, name), unsafe=True)
+        surface = cairosvg.surface.PNGSurface(tree, None, dpi=72, **kwargs)
+        pixels.append(bytes(surface.cairo.get_data()))
+    return pixels
+
+
+def count_calls(function, *args):
+    """Count the calls of Cairo functions made by ``function(*args)``."""
+    counter = CallCounter(cairocffi.cairo)
+    modules = [
+        module for name, module in list(sys.modules.items())
+        if name.startswith('cairocffi') and
+        getattr(module, 'cairo', None) is counter.library]
+    for module in modules:
+        module.cairo = counter
+    try:
+        function(*args)
+    finally:
+        for module in modules:
+            module.cairo = counter.library
+    return counter.calls
+
+
+def calls():
+    """Count the calls of Cairo functions building paths."""
+    documents = (
+        ('path with 20000 segments', '<path d="M 0 0 {}"/>'.format(
+            ' '.join('L {} {}'.format(i % 100, i // 100)
+                     for i in range(20000)))),
+        ('polyline with 10000 points', '<polyline points="{}"/>'.format(
+            ' '.join('{},{}'.format(i % 100, i // 100)
+                     for i in range(10000)))),
+        ('rounded rect drawn 1000 times', 1000 * (
+            '<rect x="1" y="1" width="50" height="50" rx="5"/>')))
+    for label, content in documents:
+        svg = '<svg xmlns="{}" width="100" height="100">{}</svg>'.format(
+            'http://www.w3.org/2000/svg', content)
+        counts = count_calls(
+            cairosvg.svg2png, svg.encode('utf-8'))
+        print('{}: {}'.format(label, sum(
+            count for name, count in counts.items()
+            if name in PATH_FUNCTIONS)))
+    counts = count_calls(render_corpus)
+    print('non-regression corpus: {} ({} calls in total)'.format(
+        sum(count for name, count in counts.items()
+            if name in PATH_FUNCTIONS), sum(counts.values())))
+
+
+def tolerance():
+    """Time raster rendering with the different tolerance options."""
+    arcs = ' '.join(
+        'M {0} {1} a 40 20 {2} 1 1 5 5 z'.format(
+            i % 50 * 20, i // 50 * 20, i % 360) for i in range(2500))
+    svg = (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="1000" height="1000">'
+        '<path d="{}" fill="red" stroke="blue"/></svg>'.format(arcs))
+    references = {}
+    for label, function in (
+            ('non-regression corpus', render_corpus),
+            ('2500 elliptical arcs', lambda **kwargs: [cairosvg.svg2png(
+                svg.encode('utf-8'), **kwargs)])):
+        for option in (None, 'auto'):
+            start = time.time()
+            for _ in range(3):
+                pixels = function(tolerance=option)
+            duration = (time.time() - start) / 3
+            references.setdefault(label, pixels)
+            changed = sum(
+                reference != result for reference, result
+                in zip(references[label], pixels))
+            print('{}, tolerance={}: {:.2f}s, {} images changed'.format(
+                label, option, duration, changed))
+
+
+def deep():
+    """Time parsing and walking deeply nested documents."""
+    for depth in (5000, 50000):
+        bytestring = (
+            b'<svg xmlns="http://www.w3.org/2000/svg" fill="lime">' +
+            b'<g>' * depth + b'<rect width="5" height="5"/>' +
+            b'</g>' * depth + b'</svg>')
+        start = time.time()
+        tree = cairosvg.parser.Tree(
+            bytestring=bytestring, xml_parser='defusedxml')
+        parsed = time.time()
+        node = tree
+        while node.children:
+            node, = node.children
+            for key in ('fill', 'stroke', 'font-size'):
+                node.get(key)
+        print('{} levels: parsed in {:.2f}s, walked in {:.2f}s'.format(
+            depth, parsed - start, time.time() - parsed))
+
+
+def gradients():
+    """Time drawing shapes painted by definitions with an href."""
+    svg = (
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        'xmlns:xlink="http://www.w3.org/1999/xlink" width="100" height="100">'
+        '<linearGradient id="a"><stop stop-color="red"/>'
+        '<stop offset="1" stop-color="blue"/></linearGradient>'
+        '<linearGradient id="b" xlink:href="#a" x2="0" y2="1"/>'
+        '<pattern id="c" width=".5" height=".5"><rect width="5" height="5"/>'
+        '</pattern><pattern id="d" xlink:href="#c"/>{}</svg>'.format(''.join(
+            '<rect x="{}" y="{}" width="5" height="5" fill="url(#{})"/>'
+            .format(i % 20 * 5, i // 20 % 20 * 5, 'b' if i % 2 else 'd')
+            for i in range(10000))))
+    tree_class = cairosvg.defs.Tree
+    trees = []
+
+    def counted_tree(**kwargs):
+        trees.append(kwargs.get('url'))
+        return tree_class(**kwargs)
+
+    cairosvg.defs.Tree = counted_tree
+    try:
+        start = time.time()
+        cairosvg.svg2png(svg.encode('utf-8'))
+    finally:
+        cairosvg.defs.Tree = tree_class
+    print('10000 rects: drawn in {:.2f}s, {} trees built'.format(
+        time.time() - start, len(trees)))
+
+
+def create_nodes(bytestring):
+    """Parse ``bytestring`` and create all its nodes, return the duration."""
+    start = time.time()
+    nodes = [cairosvg.parser.Tree(
+        bytestring=bytestring, xml_parser='defusedxml')]
+    while nodes:
+        nodes.extend(nodes.pop().children)
+    return time.time() - start
+
+
+def paths():
+    """Time parsing and building paths with many segments."""
+    commands = (
+        'L {0} {1}', 'l 1 -1', 'C {0} 0 0 {1} {1} {0}', 'q 1 2 3 4',
+        'H {0}', 'v -2.5e-1', 'S {1} {0} 5 5', 't .5.5')
+    for segments in (1000, 4000, 16000):
+        d = 'M 0 0 ' + ' '.join(
+            commands[i % len(commands)].format(i % 100, i // 100 % 100)
+            for i in range(segments))
+        # Paths are not painted, rasterization would hide their parsing
+        svg = (
+            '<svg xmlns="http://www.w3.org/2000/svg" width="100" '
+            'height="100"><path d="{}" fill="none"/></svg>'.format(d))
+        durations = []
+        for _ in range(3):
+            if hasattr(cairosvg, 'path_data'):
+                cairosvg.path_data.PATH_CACHE.clear()
+            start = time.time()
+            cairosvg.svg2png(svg.encode('utf-8'))
+            durations.append(time.time() - start)
+        print('{} segments: {:.3f}s'.format(segments, min(durations)))
+
+
+def xml():
+    """Time parsing documents with the different XML parsers."""
+    groups = 200000
+    bytestring = (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10">' +
+        groups * '<g><rect width="1" height="1" fill="red"/></g>' +
+        '</svg>').encode('utf-8')
+    names = sorted(os.listdir(SVG_FOLDER), key=str.lower)
+    for xml_parser in sorted(cairosvg.parser.XML_PARSERS):
+        parse = cairosvg.parser.XML_PARSERS[xml_parser]
+        start = time.time()
+        for name in names:
+            with open(os.path.join(SVG_FOLDER, name), 'rb') as source:
+                parse(cairosvg.parser.decompress(source), True)
+        corpus = time.time() - start
+        start = time.time()
+        cairosvg.parser.Tree(bytestring=bytestring, xml_parser=xml_parser)
+        print('{}: non-regression corpus parsed in {:.2f}s, {} groups in '
+              '{:.2f}s'.format(
+                  xml_parser, corpus, groups, time.time() - start))
+
+
+def selectors():
+    """Time creating the nodes of documents with large stylesheets."""
+    content = ''.join(
+        '<g id="layer-{}">{}</g>'.format(layer, ''.join(
+            '<g class="cls-{}">{}</g>'.format(
+                layer * 20 + group, 10 * '<rect data-name="n{}"/>'.format(
+                    layer * 20 + group))
+            for group in range(20)))
+        for layer in range(10))
+    depth = 5000
+    deep_content = ''.join(
+        '<g class="group-{}">'.format(i % 200) for i in range(depth)) + (
+        '<rect/>' + '</g>' * depth)
+    for label, rule, content in (
+            ('.cls-N', '.cls-{1}', content),
+            ('#layer-M .cls-N rect', '#layer-{} .cls-{} rect', content),
+            ('[data-name=nN]', '[data-name=n{1}]', content),
+            ('.cls-N g, {} nested groups'.format(depth), '.cls-{1} g',
+             deep_content)):
+        durations = []
+        for rules in (10, 1000, 10000):
+            stylesheet = ''.join(
+                rule.format(i % 10, i) + ' { fill: red }'
+                for i in range(rules))
+            bytestring = (
+                '<svg xmlns="http://www.w3.org/2000/svg"><style>{}</style>{}'
+                '</svg>'.format(stylesheet, content)).encode('utf-8')
+            durations.append(min(create_nodes(bytestring) for _ in range(3)))
+        print('"{}", 10 / 1k / 10k rules: {:.3f} / {:.3f} / {:.3f}s'.format(
+            label, *durations))
+
+
+BENCHMARKS = {
+    'calls': calls, 'deep': deep, 'gradients': gradients, 'paths': paths,
+    'selectors': selectors, 'tolerance': tolerance, 'xml': xml}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in BENCHMARKS:
+        sys.exit('Usage: benchmark.py {}'.format('|'.join(sorted(BENCHMARKS))))
+    BENCHMARKS[sys.argv[1]]()
@@ -19,6 +19,8 @@ CairoSVG helpers tests.
 
 """
 
+from array import array
+
 from . import cairosvg
 
 helpers = cairosvg.helpers
@@ -45,3 +47,147 @@ def test_normalize():
     helpers.normalize('-12.e3  13E-8.1,') == '-12.e3 13e-8.1'
     helpers.normalize('.1.2-.2e3.2.13E-8.1.1\n') == (
         '.1 .2 -.2e3.2 .13e-8.1 .1')
+
+
+def test_path_commands():
+    """Test ``helpers.path_commands``."""
+    assert list(helpers.path_commands('')) == []
+    assert list(helpers.path_commands('M 1 2 3 4 z')) == [
+        ('M', (1, 2)), ('L', (3, 4)), ('z', ())]
+    assert list(helpers.path_commands('m1-2.5.5,1e1h-3')) == [
+        ('m', (1, -2.5)), ('l', (.5, 10)), ('h', (-3,))]
+    assert list(helpers.path_commands('a1 1 0 0150-25')) == [
+        ('a', (1, 1, 0, 0, 1, 50, -25))]
+    assert list(helpers.path_commands('M 1 2 L 3 z 4')) == [('M', (1, 2))]
+
+
+def test_numbers():
+    """Test ``helpers.numbers``."""
+    assert helpers.numbers('') == []
+    assert helpers.numbers('1,2.5-3') == [(1, ''), (2.5, ''), (-3, '')]
+    assert helpers.numbers('1.1.2e2 3em\t4% 5px') == [
+        (1.1, ''), (.2e2, ''), (3, 'em'), (4, '%'), (5, 'px')]
+
+
+def test_points():
+    """Test ``helpers.points``."""
+    assert list(helpers.points(None, '')) == []
+    assert list(helpers.points(None, '1,2 3-4.5.5')) == [1, 2, 3, -4.5, .5]
+    assert list(helpers.points(None, '1e1, 2 3 4')) == [10, 2, 3, 4]
+
+
+def test_lru_cache():
+    """Test ``helpers.LRUCache``."""
+    cache = helpers.LRUCache(2)
+    assert cache.get('a', str.upper) == 'A'
+    assert cache.get('a', str.lower) == 'A'
+    assert cache.get('b', str.upper) == 'B'
+    assert cache.get('c', str.upper) == 'C'
+    assert cache.get('a', str.lower) == 'a'
+    assert cache.info() == (1, 4, 2, 2)
+    cache.resize(1)
+    assert cache.info().currsize == 1
+    cache.clear()
+    assert cache.info() == (0, 0, 1, 0)
+
+    # Cache limited by the total weight of its values
+    cache = helpers.LRUCache(10, weight=len, maxweight=5)
+    assert cache.get('ab', str.upper) == 'AB'
+    assert cache.get('cde', str.upper) == 'CDE'
+    assert cache.get('f', str.upper) == 'F'
+    assert cache.info().currsize == 2
+    assert cache.get('ghijkl', str.upper) == 'GHIJKL'
+    assert cache.info().currsize == 2
+    assert cache.get('f', str.lower) == 'F'
+
+
+def test_parse_path():
+    """Test ``path_data.parse_path``."""
+    parse_path = cairosvg.path_data.parse_path
+    path_data = parse_path('M 1 2 l 3 4 T 5 5 z')
+    assert path_data.segments == (
+        ('M', 1, 2), ('L', 4, 6), ('Q', 4, 6, 5, 5), ('Z', 1, 2))
+    assert len(path_data.vertices) == 6
+    assert parse_path('M 1 2 l 3 4 T 5 5 z', 3, 4) is path_data
+    assert parse_path('l 1 1', 1, 2).segments == (('L', 2, 3),)
+
+    # Relative paths are cached once, whatever their start point
+    cairosvg.path_data.PATH_CACHE.clear()
+    path_data = parse_path('l 1 1 z', 1, 2)
+    assert path_data.segments == (('L', 2, 3), ('Z', 1, 2))
+    assert path_data.vertices == (
+        (1, 2), path_data.vertices[1], (2, 3), None)
+    assert parse_path('l 1 1 z', 3, 4).segments == (
+        ('L', 4, 5), ('Z', 3, 4))
+    assert cairosvg.path_data.PATH_CACHE.info().hits == 1
+    assert parse_path('l 1 1 L 1 1', 3, 4).segments == (
+        ('L', 4, 5), ('L', 1, 1))
+
+
+def test_append_path():
+    """Test ``helpers.append_path``."""
+    cairo = cairosvg.surface.cairo
+
+    class Surface:
+        context = cairo.Context(
+            cairo.ImageSurface(cairo.FORMAT_ARGB32, 10, 10))
+
+    class PublicContext:
+        """Context only giving the public ``append_path`` method."""
+        def __init__(self, context):
+            self.append_path = context.append_path
+
+    expected = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 10, 10))
+    expected.move_to(1, 2)
+    expected.line_to(3.5, -4)
+    expected.curve_to(5, 6, 7, 8, 9, 10)
+    expected.close_path()
+    data = array('d', (
+        helpers.MOVE_TO, 0, 1, 2, helpers.LINE_TO, 0, 3.5, -4,
+        helpers.CURVE_TO, 0, 5, 6, 7, 8, 9, 10, helpers.CLOSE_PATH, 0))
+
+    surface = Surface()
+    helpers.append_path(surface, data)
+    assert surface.context.copy_path() == expected.copy_path()
+
+    # Fallback used when cairocffi internals are not available
+    surface.context.new_path()
+    helpers.append_raw_path(PublicContext(surface.context), data)
+    assert surface.context.copy_path() == expected.copy_path()
+
+
+def test_bounding_box_path():
+    """Test ``bounding_box.bounding_box_path``."""
+    bounding_box_path = cairosvg.bounding_box.bounding_box_path
+    # Reflected control points of smooth curves are included
+    assert bounding_box_path(None, {'d': 'M 0 0 Q 5 10 10 0 T 20 0'}) == (
+        0, -10, 20, 20)
+    assert bounding_box_path(
+        None, {'d': 'M 0 0 C 0 5 5 5 5 0 s 5 -5 5 0'}) == (0, -5, 10, 10)
+    # Closing a subpath goes back to its start
+    assert bounding_box_path(None, {'d': 'M 10 10 l 10 0 z l 0 5'}) == (
+        10, 10, 10, 5)
+    # Arcs with a zero radius are lines
+    assert bounding_box_path(None, {'d': 'M 0 0 a 0 5 0 0 1 10 10'}) == (
+        0, 0, 10, 10)
+
+
+def test_simplify():
+    """Test ``helpers.simplify``."""
+    class Surface:
+        context = cairosvg.surface.cairo.Context(
+            cairosvg.surface.cairo.ImageSurface(
+                cairosvg.surface.cairo.FORMAT_ARGB32, 10, 10))
+        simplify = 1
+
+    surface = Surface()
+    xs, ys = [0, .1, .2, .3, .4, 1.5, 2.5], [0, 5, -5, 1, 2, 0, 0]
+    xs, ys = helpers.simplify(surface, xs, ys)
+    assert list(xs) == [0, .1, .2, .4, 1.5, 2.5]
+    assert list(ys) == [0, 5, -5, 2, 0, 0]
+    assert helpers.simplify(surface, [0, 0], [0, 1]) == ([0, 0], [0, 1])
+
+    # Columns are in device space
+    surface.context.scale(10, 10)
+    xs, ys = helpers.simplify(surface, [0, .1, .2, .3, .4], [0, 5, -5, 1, 2])
+    assert list(xs) == [0, .1, .2, .3, .4]